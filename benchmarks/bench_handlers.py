@@ -0,0 +1,333 @@
+"""
+End-to-end handler benchmarks on a synthetic dataset.
+
+Seeds a database with synthetic users and expenses, then drives the real handlers
+(Stats, Forecast, History, Excel, PDF, CSV import) through `Dispatcher.feed_update`
+with a stubbed Bot that answers every API call locally. Reports p50/p95/p99 latency,
+peak RSS and rows/s per scenario as JSON.
+
+Usage (from the project root):
+    python -m benchmarks.bench_handlers                              # temp SQLite, 100 users, 100k rows
+    python -m benchmarks.bench_handlers --users 1000 --rows 1000000 --iterations 50
+    python -m benchmarks.bench_handlers --db postgresql+asyncpg://... --scenarios stats forecast
+    python -m benchmarks.bench_handlers --output after.json --compare before.json
+    python -m benchmarks.bench_handlers --memory                     # adds traced Python peak memory (slower)
+
+The database is taken from --db (default: a fresh temporary SQLite file). Use
+--skip-seed to benchmark an already seeded database again.
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import platform
+import random
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+CATEGORIES = ["Food", "Transport", "Shopping", "Bills", "Other", "Entertainment & Leisure"]
+SCENARIOS = ["stats", "forecast", "history", "excel", "pdf", "import"]
+SEED_BATCH = 10_000
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--db", help="database URL (default: temporary SQLite file)")
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--rows", type=int, default=100_000, help="expenses seeded in total")
+    parser.add_argument("--months", type=int, default=12, help="seeded expenses span this many months")
+    parser.add_argument("--iterations", type=int, default=20, help="updates per scenario")
+    parser.add_argument("--import-rows", type=int, default=10_000, help="rows per uploaded CSV")
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=SCENARIOS)
+    parser.add_argument("--skip-seed", action="store_true")
+    parser.add_argument("--memory", action="store_true", help="trace Python allocations per scenario")
+    parser.add_argument("--output", help="write the JSON report to this file (default: stdout)")
+    parser.add_argument("--compare", help="previous JSON report to print latency deltas against")
+    parser.add_argument("--seed", type=int, default=1, help="random seed")
+    return parser.parse_args()
+
+
+def percentile(sorted_values, p):
+    if not sorted_values:
+        return None
+    k = (len(sorted_values) - 1) * p / 100
+    low, high = int(k), min(int(k) + 1, len(sorted_values) - 1)
+    return sorted_values[low] + (sorted_values[high] - sorted_values[low]) * (k - low)
+
+
+def peak_rss_mb():
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    scale = 1 if sys.platform == "darwin" else 1024
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale / 2**20
+
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def synthetic_csv(n):
+    now = datetime.utcnow()
+    lines = ["amount,category,description,date"]
+    for i in range(n):
+        ts = now - timedelta(minutes=17 * i)
+        lines.append(f"{random.uniform(1, 200):.2f},{random.choice(CATEGORIES)},bench row {i},{ts:%Y-%m-%d %H:%M}")
+    return ("\n".join(lines) + "\n").encode()
+
+
+async def run(args):
+    # Project modules read DATABASE_URL at import time
+    from aiogram import Bot, Dispatcher
+    from aiogram.client.session.base import BaseSession
+    from aiogram.methods import TelegramMethod
+    from aiogram.types import (
+        Update, Message, Chat, User as TgUser, CallbackQuery, Document, File, PhotoSize
+    )
+    from sqlalchemy import select, func
+    from data.database import AsyncSessionLocal, engine, init_db, User, Expense, Subscription
+    from data.bulk import insert_expenses
+    from utils.charts import start_chart_pool, shutdown_chart_pool
+    from utils.export_worker import process_next_job, shutdown_export_pool
+    from utils import chart_cache
+    from handlers import (
+        common, expenses, statistics as stats_handlers, export, budget, insights, import_data, subscriptions, history
+    )
+
+    ids = itertools.count(1)
+
+    class StubSession(BaseSession):
+        """Answers Bot API calls locally with minimal valid objects."""
+        upload = b""
+
+        async def make_request(self, bot, method, timeout=None):
+            returning = method.__returning__
+            name = type(method).__name__
+            if name == "GetFile":
+                return File(file_id=method.file_id, file_unique_id="f", file_path="upload.csv")
+            if not isinstance(returning, type) or not issubclass(returning, Message):
+                return True
+            message_id = next(ids)
+            fields = dict(message_id=message_id, date=datetime.now(), chat=Chat(id=method.chat_id, type="private"))
+            if name == "SendPhoto":
+                fields["photo"] = [PhotoSize(file_id=f"photo{message_id}", file_unique_id="p", width=1, height=1)]
+            if name == "SendDocument":
+                fields["document"] = Document(file_id=f"doc{message_id}", file_unique_id="d")
+            return Message.model_validate(fields, context={"bot": bot})
+
+        async def stream_content(self, url, headers=None, timeout=30, chunk_size=65536, raise_for_status=True):
+            for i in range(0, len(self.upload), chunk_size):
+                yield self.upload[i:i + chunk_size]
+
+        async def close(self):
+            pass
+
+    def user(user_id):
+        return TgUser(id=user_id, is_bot=False, first_name=f"User {user_id}")
+
+    def message_update(user_id, **fields):
+        message = Message(
+            message_id=next(ids), date=datetime.now(), chat=Chat(id=user_id, type="private"),
+            from_user=user(user_id), **fields
+        )
+        return Update(update_id=next(ids), message=message)
+
+    def callback_update(user_id, data):
+        menu = Message(
+            message_id=next(ids), date=datetime.now(), chat=Chat(id=user_id, type="private"),
+            from_user=TgUser(id=1, is_bot=True, first_name="bot"), text="menu"
+        )
+        query = CallbackQuery(id=str(next(ids)), from_user=user(user_id), chat_instance="bench", message=menu, data=data)
+        return Update(update_id=next(ids), callback_query=query)
+
+    # --- Seed ---
+    await init_db()
+    user_ids = list(range(1, args.users + 1))
+    seed_seconds = None
+    if not args.skip_seed:
+        started = time.perf_counter()
+        now = datetime.utcnow()
+        span_minutes = args.months * 30 * 24 * 60
+        async with AsyncSessionLocal() as session:
+            session.add_all(User(user_id=uid, budget_limit=random.choice([0.0, 500.0, 2000.0])) for uid in user_ids)
+            session.add_all(
+                Subscription(user_id=uid, name=f"Sub {n}", amount=round(random.uniform(5, 50), 2))
+                for uid in user_ids for n in range(random.randint(0, 3))
+            )
+            await session.commit()
+        for offset in range(0, args.rows, SEED_BATCH):
+            rows = [
+                {
+                    "user_id": random.choice(user_ids),
+                    "amount": round(random.uniform(1, 200), 2),
+                    "category": random.choice(CATEGORIES),
+                    "description": None,
+                    "timestamp": now - timedelta(minutes=random.randrange(span_minutes)),
+                }
+                for _ in range(min(SEED_BATCH, args.rows - offset))
+            ]
+            async with AsyncSessionLocal() as session:
+                await insert_expenses(session, rows)
+                await session.commit()
+        seed_seconds = time.perf_counter() - started
+        print(f"Seeded {args.users} users / {args.rows} expenses in {seed_seconds:.1f} s", file=sys.stderr)
+
+    async with AsyncSessionLocal() as session:
+        rows_per_user = dict((await session.execute(
+            select(Expense.user_id, func.count()).group_by(Expense.user_id)
+        )).all())
+
+    # --- Bot & dispatcher, routers in the same order as bot.py ---
+    session = StubSession()
+    bot = Bot(token="42:BENCHMARK", session=session)
+    dp = Dispatcher()
+    for module in (common, import_data, subscriptions, stats_handlers, budget, insights, export, history, expenses):
+        dp.include_router(module.router)
+    await start_chart_pool()
+
+    csv_bytes = synthetic_csv(args.import_rows)
+    session.upload = csv_bytes
+
+    def scenario_update(name, user_id):
+        """Returns (update, rows the handler is expected to process)."""
+        if name == "stats":
+            chart_cache._file_ids.clear() # measure rendering, not the file_id cache
+            return callback_update(user_id, "stats_all"), 0 # reads rollups, not rows
+        if name == "forecast":
+            return message_update(user_id, text="🔮 Forecast"), 0
+        if name == "history":
+            return message_update(user_id, text="📜 History"), 0
+        if name == "excel":
+            return callback_update(user_id, "download_excel"), rows_per_user.get(user_id, 0)
+        if name == "pdf":
+            return callback_update(user_id, "download_pdf"), rows_per_user.get(user_id, 0)
+        document = Document(file_id="upload", file_unique_id="u", file_name="bench.csv", file_size=len(csv_bytes))
+        return message_update(user_id, document=document), args.import_rows
+
+    async def feed(update):
+        # Mirrors polling: a returned method is executed through the Bot
+        result = await dp.feed_update(bot, update)
+        if isinstance(result, TelegramMethod):
+            await bot(result)
+        # Exports are queued: include building and delivering the file
+        while await process_next_job(bot):
+            pass
+
+    async def measure(name, iterations):
+        latencies, rows = [], 0
+        for i in range(iterations):
+            update, expected_rows = scenario_update(name, user_ids[i % len(user_ids)])
+            started = time.perf_counter()
+            await feed(update)
+            latencies.append(time.perf_counter() - started)
+            rows += expected_rows
+        return latencies, rows
+
+    results = {}
+    for name in args.scenarios:
+        await measure(name, 1) # warm-up (lazy imports, worker processes, caches)
+        latencies, rows = await measure(name, args.iterations)
+        latencies.sort()
+        total = sum(latencies)
+        result = {
+            "iterations": len(latencies),
+            "p50_ms": percentile(latencies, 50) * 1000,
+            "p95_ms": percentile(latencies, 95) * 1000,
+            "p99_ms": percentile(latencies, 99) * 1000,
+            "mean_ms": statistics.fmean(latencies) * 1000,
+            "max_ms": latencies[-1] * 1000,
+            "rows": rows,
+            "rows_per_s": rows / total if rows and total else None,
+            "peak_rss_mb": peak_rss_mb(), # process high-water mark so far
+        }
+        if args.memory:
+            # Separate pass: tracemalloc slows everything down several times
+            tracemalloc.start()
+            await measure(name, min(args.iterations, 3))
+            result["traced_peak_mb"] = tracemalloc.get_traced_memory()[1] / 2**20
+            tracemalloc.stop()
+        results[name] = result
+        rate = f"{result['rows_per_s']:10.0f} rows/s" if result["rows_per_s"] else " " * 17
+        print(
+            f"{name:>9}  p50 {result['p50_ms']:8.1f} ms  p95 {result['p95_ms']:8.1f} ms  "
+            f"p99 {result['p99_ms']:8.1f} ms  {rate}  rss {result['peak_rss_mb']:6.0f} MB",
+            file=sys.stderr
+        )
+
+    shutdown_chart_pool()
+    shutdown_export_pool()
+    await bot.session.close()
+    await engine.dispose()
+
+    return {
+        "meta": {
+            "timestamp": datetime.utcnow().isoformat(timespec="seconds"),
+            "git_revision": git_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "database": engine.dialect.name,
+            "users": args.users,
+            "rows": sum(rows_per_user.values()),
+            "seed_seconds": seed_seconds,
+            "iterations": args.iterations,
+            "import_rows": args.import_rows,
+        },
+        "results": results,
+    }
+
+
+def print_comparison(report, previous_path):
+    with open(previous_path) as f:
+        previous = json.load(f)["results"]
+    print(f"\nChange vs {previous_path}:", file=sys.stderr)
+    for name, result in report["results"].items():
+        before = previous.get(name)
+        if not before:
+            continue
+        deltas = "  ".join(
+            f"{key[:3]} {(result[key] - before[key]) / before[key] * 100:+6.1f}%"
+            for key in ("p50_ms", "p95_ms", "p99_ms") if before.get(key)
+        )
+        print(f"{name:>9}  {deltas}", file=sys.stderr)
+
+
+def main():
+    args = parse_args()
+    random.seed(args.seed)
+
+    tmp_path = None
+    if args.db:
+        os.environ["DATABASE_URL"] = args.db
+    else:
+        fd, tmp_path = tempfile.mkstemp(suffix=".db")
+        os.close(fd)
+        os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{tmp_path}"
+
+    try:
+        report = asyncio.run(run(args))
+    finally:
+        if tmp_path:
+            os.remove(tmp_path)
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+    if args.compare:
+        print_comparison(report, args.compare)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+"""
+Benchmarks the paginated PDF receipt renderer on large synthetic statements.
+
+Usage (from the project root):
+    python -m benchmarks.bench_pdf              # 10k and 100k rows
+    python -m benchmarks.bench_pdf 5000 50000   # custom sizes
+    python -m benchmarks.bench_pdf --memory     # also trace Python allocations (much slower)
+"""
+import os
+import sys
+import time
+import random
+import tempfile
+import tracemalloc
+from datetime import datetime, timedelta
+from utils.pdf_generator import generate_receipt_pdf
+
+CATEGORIES = ["Food", "Transport", "Shopping", "Bills", "Other", "Entertainment & Leisure"]
+
+
+def synthetic_rows(n):
+    # Generated lazily, like rows streamed from the database
+    now = datetime.utcnow()
+    for i in range(n):
+        yield (now - timedelta(minutes=37 * i), random.choice(CATEGORIES), None, round(random.uniform(1, 200), 2), i)
+
+
+def render(n, path):
+    started = time.perf_counter()
+    count = generate_receipt_pdf("Benchmark", synthetic_rows(n), path)
+    return count, time.perf_counter() - started
+
+
+def run(n, trace_memory=False):
+    fd, path = tempfile.mkstemp(suffix=".pdf")
+    os.close(fd)
+    try:
+        count, elapsed = render(n, path)
+        size = os.path.getsize(path)
+        line = (
+            f"{count:>8} rows  {elapsed:7.2f} s  {count / elapsed:9.0f} rows/s  "
+            f"file {size / 2**20:6.1f} MiB"
+        )
+        if trace_memory:
+            # Separate pass: tracemalloc slows rendering down several times
+            tracemalloc.start()
+            render(n, path)
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            line += f"  peak {peak / 2**20:7.1f} MiB"
+    finally:
+        os.remove(path)
+    print(line)
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    trace_memory = "--memory" in args
+    sizes = [int(arg) for arg in args if arg != "--memory"] or [10_000, 100_000]
+    for size in sizes:
+        run(size, trace_memory)
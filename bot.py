@@ -4,20 +4,59 @@ import os
 import sys
 from aiohttp import web
 from dotenv import load_dotenv
-from aiogram import Bot, Dispatcher
-from data.database import init_db
-from handlers import common, expenses, statistics, export, budget ,insights,import_data,subscriptions 
 
+# Load .env before importing project modules, they read their settings at import time
 load_dotenv()
+
+from aiogram import Bot, Dispatcher
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_application
+from data.database import init_db, engine
+from data.archive import run_archival
+from data.subscription_charges import run_subscription_scheduler
+from data.fsm_storage import SQLAlchemyStorage
+from data.write_buffer import write_buffer, WRITE_BUFFER_ENABLED
+from utils.charts import start_chart_pool, shutdown_chart_pool
+from utils.prewarm import prewarm_imports, PREWARM_IMPORTS
+from utils import metrics
+from utils.throttling import setup_throttling
+from utils.budget_alerts import setup_budget_alerts, run_reconciliation, alert_users
+from utils.export_worker import start_export_workers, shutdown_export_pool
+from handlers import common, expenses, statistics, export, budget ,insights,import_data,subscriptions,history
+
 TOKEN = os.getenv("BOT_TOKEN")
 
+# "polling" (default) or "webhook"
+BOT_MODE = os.getenv("BOT_MODE", "polling")
+WEBHOOK_URL = os.getenv("WEBHOOK_URL", "") # public base URL, e.g. https://my-bot.example.com
+WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "/webhook")
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET")
+
 async def health_check(request):
-    return web.Response(text="Bot is alive!")
+    lag_ms = metrics.last_event_loop_lag * 1000
+    return web.Response(text=f"Bot is alive!\nEvent loop lag: {lag_ms:.1f} ms")
+
+async def metrics_endpoint(request):
+    body, content_type = metrics.render_latest()
+    return web.Response(body=body, headers={"Content-Type": content_type})
 
-async def start_web_server():
+async def start_web_server(dp, bot):
     port = int(os.getenv("PORT", 8080))
     app = web.Application()
     app.router.add_get("/", health_check)
+    app.router.add_get("/metrics", metrics_endpoint)
+
+    if BOT_MODE == "webhook":
+        # Updates are processed inside the request, so a handler that *returns* a method
+        # (e.g. `return message.answer(...)`) gets it sent back as the webhook response,
+        # saving one Bot API call. Slow handlers are moved to the background by aiogram.
+        SimpleRequestHandler(
+            dispatcher=dp,
+            bot=bot,
+            secret_token=WEBHOOK_SECRET,
+            handle_in_background=False
+        ).register(app, path=WEBHOOK_PATH)
+        setup_application(app, dp, bot=bot)
+
     runner = web.AppRunner(app)
     await runner.setup()
     site = web.TCPSite(runner, "0.0.0.0", port)
@@ -25,12 +64,39 @@ async def start_web_server():
     print(f"Web server started on port {port}")
 
 async def main():
-    # 1. Init Database
+    # 1. Init Database & warm up the chart workers
     await init_db()
+    await start_chart_pool()
+    if WRITE_BUFFER_ENABLED:
+        write_buffer.start()
 
     # 2. Setup Bot & Dispatcher
     bot = Bot(token=TOKEN)
-    dp = Dispatcher()
+    storage = SQLAlchemyStorage() # FSM state lives in the DB, survives restarts
+    dp = Dispatcher(storage=storage)
+    cleanup_task = asyncio.create_task(storage.run_cleanup())
+    # Daily: upcoming expense partitions + archival of cold history
+    archive_task = asyncio.create_task(run_archival())
+    # Daily: subscriptions due today become expenses, then budget alerts for the charged users
+    subscription_task = asyncio.create_task(
+        run_subscription_scheduler(on_charged=lambda user_ids: alert_users(bot, user_ids))
+    )
+
+    # Prometheus metrics (served on /metrics)
+    metrics.instrument_engine(engine)
+    metrics.setup_dispatcher_metrics(dp)
+    metrics.setup_bot_metrics(bot)
+    lag_task = asyncio.create_task(metrics.monitor_event_loop_lag())
+
+    # Bounded concurrency for handlers flagged as heavy (charts, imports)
+    setup_throttling(dp)
+    # 80% / 100% budget alerts after expenses are added
+    setup_budget_alerts(dp)
+    reconcile_task = asyncio.create_task(run_reconciliation())
+
+    # PDF/Excel exports are queued in the DB and delivered by background workers
+    export_tasks = start_export_workers(bot)
+    prewarm_task = None
 
     # 3. Register Routers
     dp.include_router(common.router)
@@ -40,20 +106,51 @@ async def main():
     dp.include_router(budget.router)
     dp.include_router(insights.router)
     dp.include_router(export.router)
+    dp.include_router(history.router)
     dp.include_router(expenses.router)
 
-    # 4. Start the Fake Server (Background task)
-    await start_web_server()
+    try:
+        # 4. Start the Web Server (health check + webhook endpoint)
+        await start_web_server(dp, bot)
+
+        if PREWARM_IMPORTS:
+            # Heavy libraries are imported lazily; load them once we are already serving
+            prewarm_task = asyncio.create_task(prewarm_imports())
 
-    # 5. Start Polling
-    print("Bot is running...")
-    # remove_webhook is useful if switching from other hosting methods
-    await bot.delete_webhook(drop_pending_updates=True) 
-    await dp.start_polling(bot)
+        print("Bot is running...")
+        if BOT_MODE == "webhook":
+            # 5a. Let Telegram push updates to us
+            if not WEBHOOK_URL or not WEBHOOK_SECRET:
+                sys.exit("BOT_MODE=webhook requires WEBHOOK_URL and WEBHOOK_SECRET")
+            await bot.set_webhook(
+                f"{WEBHOOK_URL.rstrip('/')}{WEBHOOK_PATH}",
+                secret_token=WEBHOOK_SECRET,
+                allowed_updates=dp.resolve_used_update_types(),
+                drop_pending_updates=True
+            )
+            await asyncio.Event().wait() # serve until the process is stopped
+        else:
+            # 5b. Start Polling
+            # remove_webhook is useful if switching from other hosting methods
+            await bot.delete_webhook(drop_pending_updates=True)
+            await dp.start_polling(bot)
+    finally:
+        cleanup_task.cancel()
+        archive_task.cancel()
+        subscription_task.cancel()
+        reconcile_task.cancel()
+        lag_task.cancel()
+        for task in export_tasks:
+            task.cancel()
+        shutdown_export_pool()
+        if prewarm_task:
+            prewarm_task.cancel()
+        await write_buffer.stop()
+        shutdown_chart_pool()
 
 if __name__ == "__main__":
     logging.basicConfig(level=logging.INFO)
     try:
         asyncio.run(main())
     except KeyboardInterrupt:
-        print("Bot stopped")
\ No newline at end of file
+        print("Bot stopped")
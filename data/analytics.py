@@ -0,0 +1,88 @@
+"""
+Day x category spending buckets for the Forecast analytics (utils/forecast.py).
+"""
+from datetime import datetime, timedelta
+from sqlalchemy import select, func, literal_column, cast, null, union_all, or_, exists, Float, Integer, String
+from data.database import Expense, Subscription
+from data.partitions import add_months, month_start
+from data.user_cache import cached_profile, remember, profile_query, profile_from_rows
+
+ANALYTICS_MONTHS = 12
+
+
+def day_expr(dialect_name, column=Expense.timestamp):
+    """SQL expression turning a timestamp column into a 'YYYY-MM-DD' string."""
+    if dialect_name == "postgresql":
+        return func.to_char(column, literal_column("'YYYY-MM-DD'"))
+    return func.strftime(literal_column("'%Y-%m-%d'"), column)
+
+
+def analytics_window(now, months=ANALYTICS_MONTHS):
+    """[first day, end) covering this month and the `months - 1` before it, up to today."""
+    first_day = add_months(month_start(now), -(months - 1))
+    end = datetime(now.year, now.month, now.day) + timedelta(days=1)
+    return first_day, end
+
+
+def daily_category_totals_query(dialect_name, user_id, first_day, end, exclude_subscription_charges=False):
+    """
+    (day 'YYYY-MM-DD', category, total) per day and category, one grouped range scan.
+    `exclude_subscription_charges` leaves out the charges of existing subscriptions
+    (data/subscription_charges.py); those of deleted ones count as ordinary spending.
+    """
+    day = day_expr(dialect_name)
+    query = (
+        select(day.label("day"), Expense.category, func.sum(Expense.amount).label("total"))
+        .where(Expense.user_id == user_id, Expense.timestamp >= first_day, Expense.timestamp < end)
+        .group_by(day, Expense.category)
+    )
+    if exclude_subscription_charges:
+        query = query.where(or_(
+            Expense.subscription_id.is_(None),
+            # the user's own subscriptions only, so a hashed subplan stays small on Postgres
+            ~exists().where(Subscription.user_id == user_id, Subscription.id == Expense.subscription_id),
+        ))
+    return query
+
+
+async def daily_category_totals(session, user_id, first_day, end, exclude_subscription_charges=False):
+    query = daily_category_totals_query(
+        session.bind.dialect.name, user_id, first_day, end, exclude_subscription_charges
+    )
+    return (await session.execute(query)).all()
+
+
+def forecast_query(dialect_name, user_id, first_day, end, exclude_subscription_charges=False):
+    """
+    The day x category buckets and the user's `profile_query` rows in one statement:
+    (day, category, total, budget_limit, subscription_id, starts_month). Profile rows
+    have no day and carry a subscription's name and amount in category and total.
+    """
+    buckets = daily_category_totals_query(dialect_name, user_id, first_day, end, exclude_subscription_charges)
+    buckets = buckets.add_columns(
+        cast(null(), Float).label("budget_limit"), cast(null(), Integer).label("subscription_id"),
+        cast(null(), String).label("starts_month"),
+    )
+    profile = profile_query(user_id).order_by(None).subquery()
+    profile = select(
+        cast(null(), String).label("day"), profile.c.name, profile.c.amount, profile.c.budget_limit,
+        profile.c.id, profile.c.starts_month,
+    )
+    return union_all(buckets, profile)
+
+
+async def forecast_data(session, user_id, first_day, end, exclude_subscription_charges=False):
+    """(bucket rows, UserProfile): one round trip, also when the profile is not cached."""
+    profile = cached_profile(user_id)
+    if profile is not None:
+        rows = await daily_category_totals(session, user_id, first_day, end, exclude_subscription_charges)
+        return rows, profile
+
+    query = forecast_query(session.bind.dialect.name, user_id, first_day, end, exclude_subscription_charges)
+    rows = (await session.execute(query)).all()
+    profile = profile_from_rows([
+        (budget_limit, sub_id, name, amount, starts_month)
+        for day, name, amount, budget_limit, sub_id, starts_month in rows if day is None
+    ])
+    remember(user_id, profile)
+    return [(day, category, total) for day, category, total, _, _, _ in rows if day is not None], profile
@@ -0,0 +1,111 @@
+"""
+Archival of cold expense history. Off by default: archived rows are gone for good.
+
+With ARCHIVE_AFTER_MONTHS set, expenses older than that many full months are replaced by compact
+(user, month, category) -> total, count summaries in `expense_archive`:
+- Postgres: every monthly partition (data/partitions.py) that lies entirely before
+  the cutoff is detached with DETACH PARTITION CONCURRENTLY, which does not block
+  reads and writes of `expenses`, then summarized and dropped in one transaction.
+  A detach that was interrupted is finalized by the next run;
+- SQLite and unpartitioned Postgres tables: rows are deleted in batches of
+  ARCHIVE_BATCH_SIZE and their summaries added in the same transaction.
+
+The rollups are not touched, so stats keep the same totals; exports append the
+archived summaries (data/exports.py). History and delete only see live rows.
+"""
+import os
+import asyncio
+import logging
+from datetime import datetime
+from sqlalchemy import select, delete, text
+from data.database import AsyncSessionLocal, Expense, engine
+from data.partitions import add_months, month_start, month_tables, ensure_future_partitions
+from data.rollups import add_to_archive
+
+logger = logging.getLogger(__name__)
+
+ARCHIVE_AFTER_MONTHS = int(os.getenv("ARCHIVE_AFTER_MONTHS", 0)) # 0 keeps everything
+ARCHIVE_BATCH_SIZE = int(os.getenv("ARCHIVE_BATCH_SIZE", 5000))
+ARCHIVE_INTERVAL_SECONDS = 24 * 60 * 60
+
+
+def archive_cutoff(months, now=None):
+    """First day of the oldest month that stays live."""
+    return add_months(month_start(now or datetime.utcnow()), -months)
+
+
+async def _detach_partition(name, state):
+    # CONCURRENTLY cannot run inside a transaction block
+    async with engine.connect() as conn:
+        conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+        mode = "FINALIZE" if state == "detaching" else "CONCURRENTLY"
+        await conn.execute(text(f"ALTER TABLE expenses DETACH PARTITION {name} {mode}"))
+
+
+async def _archive_partitions(session, cutoff):
+    connection = await session.connection()
+    tables = await connection.run_sync(month_tables)
+    # A concurrent detach waits for every open transaction on `expenses`, ours included
+    await session.commit()
+    archived = 0
+    for month, (name, state) in sorted(tables.items()):
+        if add_months(month, 1) > cutoff:
+            break
+        if state != "detached":
+            await _detach_partition(name, state)
+        # No longer part of `expenses`: summarizing and dropping it blocks nobody
+        rows = await session.scalar(text(f"SELECT count(*) FROM {name}"))
+        await session.execute(text(
+            "INSERT INTO expense_archive (user_id, year_month, category, total, count) "
+            f"SELECT user_id, to_char(timestamp, 'YYYY-MM'), category, sum(amount), count(*) FROM {name} "
+            "GROUP BY 1, 2, 3 "
+            "ON CONFLICT (user_id, year_month, category) DO UPDATE SET "
+            "total = expense_archive.total + excluded.total, count = expense_archive.count + excluded.count"
+        ))
+        await session.execute(text(f"DROP TABLE {name}"))
+        await session.commit()
+        logger.info("Archived partition %s (%d expenses)", name, rows)
+        archived += rows
+    return archived
+
+
+async def _archive_batch(session, cutoff, batch_size):
+    old_ids = select(Expense.id).where(Expense.timestamp < cutoff).limit(batch_size)
+    result = await session.execute(
+        delete(Expense).where(Expense.id.in_(old_ids))
+        .returning(Expense.user_id, Expense.timestamp, Expense.category, Expense.amount)
+    )
+    removed = result.mappings().all()
+    await add_to_archive(session, removed)
+    await session.commit()
+    return len(removed)
+
+
+async def archive_expenses(months=ARCHIVE_AFTER_MONTHS, batch_size=ARCHIVE_BATCH_SIZE):
+    """Moves expenses older than `months` full months into the archive. Returns the number moved."""
+    cutoff = archive_cutoff(months)
+    archived = 0
+    async with AsyncSessionLocal() as session:
+        if session.bind.dialect.name == "postgresql":
+            archived += await _archive_partitions(session, cutoff)
+        while True:
+            removed = await _archive_batch(session, cutoff, batch_size)
+            if not removed:
+                break
+            archived += removed
+    return archived
+
+
+async def run_archival(interval=ARCHIVE_INTERVAL_SECONDS):
+    """Daily: creates upcoming partitions, then archives cold history."""
+    while True:
+        try:
+            async with engine.begin() as conn:
+                await conn.run_sync(ensure_future_partitions)
+            if ARCHIVE_AFTER_MONTHS:
+                archived = await archive_expenses()
+                if archived:
+                    logger.info("Archived %d expenses older than %d months", archived, ARCHIVE_AFTER_MONTHS)
+        except Exception:
+            logger.exception("Expense archival failed")
+        await asyncio.sleep(interval)
@@ -0,0 +1,43 @@
+"""
+Set-based expense inserts for paths that add many rows at once (CSV import).
+
+Rows are plain dicts with the keys in EXPENSE_COLUMNS. Inserts run in the
+caller's session/transaction together with the matching rollup update.
+"""
+from data.database import Expense
+from data.partitions import ensure_partitions_for
+from data.rollups import add_to_rollups
+
+EXPENSE_COLUMNS = ["user_id", "amount", "category", "description", "timestamp"]
+
+
+async def _copy_into_postgres(session, rows):
+    conn = await session.connection()
+    raw = await conn.get_raw_connection()
+    # asyncpg connection bound to the session's transaction
+    await raw.driver_connection.copy_records_to_table(
+        Expense.__tablename__,
+        records=[tuple(row[c] for c in EXPENSE_COLUMNS) for row in rows],
+        columns=EXPENSE_COLUMNS,
+    )
+
+
+async def insert_expenses(session, rows):
+    """
+    Inserts many expenses in one round trip: COPY on Postgres,
+    a Core executemany INSERT elsewhere. Also updates the rollups.
+    """
+    if not rows:
+        return
+
+    # First: asyncpg only sends BEGIN with the first statement, and a raw COPY before
+    # it would be committed on its own, outside the transaction with the rollups
+    await add_to_rollups(session, rows)
+
+    if session.bind.dialect.name == "postgresql":
+        # Old or far future dates may need a new monthly partition first
+        conn = await session.connection()
+        await conn.run_sync(ensure_partitions_for, [row["timestamp"] for row in rows])
+        await _copy_into_postgres(session, rows)
+    else:
+        await session.execute(Expense.__table__.insert(), rows)
@@ -1,9 +1,10 @@
 import os
 import asyncio
-from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
+from sqlalchemy.ext.asyncio import async_sessionmaker, AsyncSession
 from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column
-from sqlalchemy import Integer, String, Float, DateTime
+from sqlalchemy import Integer, String, Float, DateTime, Text, Index
 from datetime import datetime
+from data.db_profiles import create_engine_for_profile
 
 database_url = os.getenv("DATABASE_URL")
 
@@ -15,7 +16,9 @@ if database_url:
 else:
     database_url = "sqlite+aiosqlite:///./expense.db"
 
-engine = create_async_engine(database_url, echo=False, pool_pre_ping=True)
+# Pool / pragma settings, see data/db_profiles.py
+DB_PROFILE = os.getenv("DB_PROFILE", "standard")
+engine = create_engine_for_profile(database_url, DB_PROFILE, echo=False, pool_pre_ping=True)
 AsyncSessionLocal = async_sessionmaker(engine, expire_on_commit=False, class_=AsyncSession)
 
 class Base(DeclarativeBase):
@@ -25,27 +28,125 @@ class User(Base):
     __tablename__ = "users"
 
     # Telegram User ID as the Primary Key
-    user_id: Mapped[int] = mapped_column(Integer, primary_key=True) 
+    user_id: Mapped[int] = mapped_column(Integer, primary_key=True)
     budget_limit: Mapped[float] = mapped_column(Float, default=0.0)
 
 class Expense(Base):
     __tablename__ = "expenses"
 
+    # Once partitioned (scripts/partition_expenses.py) the table's primary key is (id, timestamp),
+    # as Postgres requires the partition key in it; id alone stays unique (one sequence), so the
+    # ORM keeps using it as the identity
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
     user_id: Mapped[int] = mapped_column(Integer)
     amount: Mapped[float] = mapped_column(Float)
     category: Mapped[str] = mapped_column(String)
     description: Mapped[str] = mapped_column(String, nullable=True)
     timestamp: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+    # Set on the monthly charges of a subscription (data/subscription_charges.py), never by users
+    subscription_id: Mapped[int] = mapped_column(Integer, nullable=True)
+
+# History, stats, forecast, delete and export all filter by user and range/sort on time
+Index("ix_expenses_user_id_timestamp_id", Expense.user_id, Expense.timestamp.desc(), Expense.id.desc())
 
 class Subscription(Base):
     __tablename__ = "subscriptions"
+    # Charges (expenses.subscription_id, the ledger) point at the id, so a deleted
+    # subscription's id must not come back: plain SQLite would reuse the highest one
+    __table_args__ = {"sqlite_autoincrement": True}
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
-    user_id: Mapped[int] = mapped_column(Integer)
-    name: Mapped[str] = mapped_column(String) 
+    user_id: Mapped[int] = mapped_column(Integer, index=True)
+    name: Mapped[str] = mapped_column(String)
     amount: Mapped[float] = mapped_column(Float)
+    billing_day: Mapped[int] = mapped_column(Integer, default=1) # 1-31, clamped to short months
+    starts_month: Mapped[str] = mapped_column(String(7), nullable=True) # first month charged, "2024-05"
+
+class SubscriptionCharge(Base):
+    __tablename__ = "subscription_charges"
+
+    # One row per subscription and month charged, see data/subscription_charges.py
+    subscription_id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    year_month: Mapped[str] = mapped_column(String(7), primary_key=True)
+    charged_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+
+class ExpenseRollup(Base):
+    __tablename__ = "expense_rollups"
+
+    # Per-user monthly category totals, kept in sync with `expenses` by data/rollups.py
+    user_id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    year_month: Mapped[str] = mapped_column(String(7), primary_key=True) # "2024-05"
+    category: Mapped[str] = mapped_column(String, primary_key=True)
+    total: Mapped[float] = mapped_column(Float, default=0.0)
+    count: Mapped[int] = mapped_column(Integer, default=0)
+
+class MonthlyTotal(Base):
+    __tablename__ = "monthly_totals"
+
+    # Running month-to-date total per user, kept with the rollups (data/rollups.py)
+    user_id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    year_month: Mapped[str] = mapped_column(String(7), primary_key=True)
+    total: Mapped[float] = mapped_column(Float, default=0.0)
+    alerted: Mapped[int] = mapped_column(Integer, default=0) # highest budget alert sent, in % (utils/budget_alerts.py)
+
+class ExpenseArchive(Base):
+    __tablename__ = "expense_archive"
+
+    # Monthly category summaries of expenses removed by data/archive.py
+    user_id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    year_month: Mapped[str] = mapped_column(String(7), primary_key=True)
+    category: Mapped[str] = mapped_column(String, primary_key=True)
+    total: Mapped[float] = mapped_column(Float, default=0.0)
+    count: Mapped[int] = mapped_column(Integer, default=0)
+
+class FsmState(Base):
+    __tablename__ = "fsm_states"
+
+    # aiogram FSM state + data per chat/user, see data/fsm_storage.py
+    key: Mapped[str] = mapped_column(String, primary_key=True)
+    state: Mapped[str] = mapped_column(String, nullable=True)
+    data: Mapped[str] = mapped_column(Text, default="{}") # JSON
+    updated_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, index=True)
+
+class ExportJob(Base):
+    __tablename__ = "export_jobs"
+
+    # Queued PDF/Excel exports, processed by utils/export_worker.py
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    user_id: Mapped[int] = mapped_column(Integer)
+    chat_id: Mapped[int] = mapped_column(Integer)
+    kind: Mapped[str] = mapped_column(String) # "pdf" / "excel"
+    dedup_key: Mapped[str] = mapped_column(String) # identical requests share it, e.g. "pdf:current"
+    params: Mapped[str] = mapped_column(Text, default="{}") # JSON
+    status: Mapped[str] = mapped_column(String, default="pending") # pending -> running -> done / failed
+    attempts: Mapped[int] = mapped_column(Integer, default=0)
+    error: Mapped[str] = mapped_column(Text, nullable=True)
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+    heartbeat_at: Mapped[datetime] = mapped_column(DateTime, nullable=True)
+    finished_at: Mapped[datetime] = mapped_column(DateTime, nullable=True)
+
+Index("ix_export_jobs_status_id", ExportJob.status, ExportJob.id)
+# At most one pending/running job per user and request
+ACTIVE_JOB_STATUSES = ("pending", "running")
+Index(
+    "uq_export_jobs_active", ExportJob.user_id, ExportJob.dedup_key, unique=True,
+    sqlite_where=ExportJob.status.in_(ACTIVE_JOB_STATUSES),
+    postgresql_where=ExportJob.status.in_(ACTIVE_JOB_STATUSES),
+)
+
+class SchemaVersion(Base):
+    __tablename__ = "schema_version"
+
+    # One row per applied migration (see data/migrations.py)
+    version: Mapped[int] = mapped_column(Integer, primary_key=True)
+    description: Mapped[str] = mapped_column(String)
+    applied_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
 
 async def init_db():
+    from data.migrations import run_migrations
+    from data.partitions import ensure_future_partitions
+
     async with engine.begin() as conn:
-        await conn.run_sync(Base.metadata.create_all)
\ No newline at end of file
+        await conn.run_sync(Base.metadata.create_all)
+        await conn.run_sync(run_migrations)
+        await conn.run_sync(ensure_future_partitions)
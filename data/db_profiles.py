@@ -0,0 +1,80 @@
+"""
+Named engine profiles, selected with DB_PROFILE.
+
+SQLite gets its pragmas on every new connection; Postgres gets pool settings and
+the asyncpg prepared statement cache size. Options that do not apply to the
+database in use are ignored, so one profile name works for both.
+
+- legacy:    driver defaults (rollback journal on SQLite, default pool on Postgres)
+- standard:  one bot instance on a small host (default)
+- high:      bigger host or several bot instances sharing the database
+- pgbouncer: Postgres behind PgBouncer in transaction mode, which cannot keep
+             prepared statements across transactions: no statement caches, a
+             unique name per prepared statement (server connections are shared,
+             asyncpg's default names would clash) and no pool of our own
+             (PgBouncer is the pool)
+"""
+from uuid import uuid4
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.pool import NullPool
+
+WAL_PRAGMAS = {
+    "journal_mode": "WAL",  # readers no longer block the writer
+    "synchronous": "NORMAL",  # fsync at checkpoints only; safe with WAL
+    "busy_timeout": 5000,  # ms a writer waits for the lock instead of failing
+    "temp_store": "MEMORY",
+}
+
+DB_PROFILES = {
+    "legacy": {"sqlite_pragmas": {}, "pool": {}, "statement_cache_size": None, "unique_statement_names": False},
+    "standard": {
+        "sqlite_pragmas": {**WAL_PRAGMAS, "mmap_size": 64 * 2**20, "cache_size": -16000}, # 16 MB page cache
+        "pool": {"pool_size": 5, "max_overflow": 5, "pool_recycle": 1800, "pool_timeout": 30},
+        "statement_cache_size": 256,
+        "unique_statement_names": False,
+    },
+    "high": {
+        "sqlite_pragmas": {**WAL_PRAGMAS, "mmap_size": 256 * 2**20, "cache_size": -64000}, # 64 MB page cache
+        "pool": {"pool_size": 20, "max_overflow": 10, "pool_recycle": 1800, "pool_timeout": 30},
+        "statement_cache_size": 1024,
+        "unique_statement_names": False,
+    },
+    "pgbouncer": {
+        "sqlite_pragmas": {**WAL_PRAGMAS, "mmap_size": 64 * 2**20, "cache_size": -16000},
+        "pool": {"poolclass": NullPool},
+        "statement_cache_size": 0,
+        "unique_statement_names": True,
+    },
+}
+
+
+def _set_pragmas(pragmas):
+    def on_connect(dbapi_connection, _record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA {name}={value}")
+        cursor.close()
+    return on_connect
+
+
+def create_engine_for_profile(database_url, profile_name, **options):
+    try:
+        profile = DB_PROFILES[profile_name]
+    except KeyError:
+        raise ValueError(f"Unknown DB_PROFILE {profile_name!r}, expected one of: {', '.join(DB_PROFILES)}")
+
+    if database_url.startswith("postgresql"):
+        options.update(profile["pool"])
+        if profile["statement_cache_size"] is not None:
+            options["connect_args"] = {
+                "statement_cache_size": profile["statement_cache_size"], # asyncpg's own cache
+                "prepared_statement_cache_size": profile["statement_cache_size"], # SQLAlchemy's adapter cache
+            }
+        if profile["unique_statement_names"]:
+            options.setdefault("connect_args", {})["prepared_statement_name_func"] = lambda: f"__asyncpg_{uuid4()}__"
+
+    engine = create_async_engine(database_url, **options)
+    if engine.dialect.name == "sqlite" and profile["sqlite_pragmas"]:
+        event.listen(engine.sync_engine, "connect", _set_pragmas(profile["sqlite_pragmas"]))
+    return engine
@@ -0,0 +1,106 @@
+"""
+Persistent queue of export jobs in the `export_jobs` table.
+
+A job moves pending -> running -> done/failed. Running jobs refresh `heartbeat_at`;
+if a worker dies (restart, crash) its job stops heartbeating and `requeue_stale_jobs`
+puts it back to pending, so queued and interrupted exports survive restarts.
+A partial unique index on (user_id, dedup_key) for pending/running jobs makes an
+identical request join the job that is already queued.
+"""
+import json
+from datetime import datetime, timedelta
+from sqlalchemy import select, update, delete
+from data.database import AsyncSessionLocal, ExportJob, ACTIVE_JOB_STATUSES
+from data.rollups import upsert
+
+
+async def enqueue_job(user_id, chat_id, kind, dedup_key, params):
+    """Returns True if a job was queued, False if an identical one is already pending/running."""
+    async with AsyncSessionLocal() as session:
+        stmt = upsert(session.bind.dialect.name, ExportJob).values(
+            user_id=user_id, chat_id=chat_id, kind=kind, dedup_key=dedup_key,
+            params=json.dumps(params), status="pending", attempts=0, created_at=datetime.utcnow()
+        )
+        stmt = stmt.on_conflict_do_nothing(
+            index_elements=["user_id", "dedup_key"],
+            index_where=ExportJob.status.in_(ACTIVE_JOB_STATUSES),
+        ).returning(ExportJob.id)
+        job_id = (await session.execute(stmt)).scalar()
+        await session.commit()
+    return job_id is not None
+
+
+async def claim_next_job():
+    """
+    Atomically marks the oldest pending job as running and returns it (or None).
+    Postgres skips rows locked by other workers; SQLite serializes writers anyway.
+    """
+    next_id = (
+        select(ExportJob.id)
+        .where(ExportJob.status == "pending")
+        .order_by(ExportJob.id)
+        .limit(1)
+        .with_for_update(skip_locked=True)
+        .scalar_subquery()
+    )
+    async with AsyncSessionLocal() as session:
+        result = await session.execute(
+            update(ExportJob)
+            .where(ExportJob.id == next_id, ExportJob.status == "pending")
+            .values(status="running", attempts=ExportJob.attempts + 1, heartbeat_at=datetime.utcnow())
+            .returning(ExportJob.id, ExportJob.user_id, ExportJob.chat_id, ExportJob.kind,
+                       ExportJob.params, ExportJob.attempts)
+        )
+        job = result.first()
+        await session.commit()
+    return job
+
+
+async def heartbeat(job_id):
+    async with AsyncSessionLocal() as session:
+        await session.execute(
+            update(ExportJob).where(ExportJob.id == job_id).values(heartbeat_at=datetime.utcnow())
+        )
+        await session.commit()
+
+
+async def finish_job(job_id, status, error=None):
+    """status: "done", "failed", or "pending" to retry later."""
+    async with AsyncSessionLocal() as session:
+        await session.execute(
+            update(ExportJob).where(ExportJob.id == job_id).values(
+                status=status, error=error,
+                finished_at=None if status == "pending" else datetime.utcnow()
+            )
+        )
+        await session.commit()
+
+
+async def requeue_stale_jobs(stale_after, max_attempts):
+    """
+    Running jobs without a heartbeat for `stale_after` go back to pending, or fail once
+    they have used up their attempts. Returns the number of jobs requeued.
+    """
+    cutoff = datetime.utcnow() - stale_after
+    stale = (ExportJob.status == "running", ExportJob.heartbeat_at < cutoff)
+    async with AsyncSessionLocal() as session:
+        await session.execute(
+            update(ExportJob).where(*stale, ExportJob.attempts >= max_attempts)
+            .values(status="failed", error="worker stopped", finished_at=datetime.utcnow())
+        )
+        result = await session.execute(
+            update(ExportJob).where(*stale).values(status="pending")
+        )
+        await session.commit()
+    return result.rowcount
+
+
+async def delete_finished_jobs(older_than=timedelta(days=7)):
+    async with AsyncSessionLocal() as session:
+        await session.execute(
+            delete(ExportJob).where(
+                ExportJob.status.in_(("done", "failed")),
+                ExportJob.finished_at < datetime.utcnow() - older_than
+            )
+        )
+        await session.commit()
@@ -0,0 +1,52 @@
+"""
+Streaming reads of a user's expenses for exports.
+Rows come back in batches of plain tuples instead of ORM objects.
+Months removed by data/archive.py only exist as monthly summaries, see `archived_summaries`.
+"""
+import os
+from sqlalchemy import select
+from data.database import AsyncSessionLocal, Expense, ExpenseArchive
+from data.rollups import year_month
+
+# Rows fetched from the database per batch (env: EXPORT_BATCH_SIZE)
+EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", 1000))
+
+
+def export_query(user_id, start_date=None, end_date=None):
+    query = select(
+        Expense.timestamp, Expense.category, Expense.description, Expense.amount, Expense.id
+    ).where(Expense.user_id == user_id)
+    if start_date is not None:
+        query = query.where(Expense.timestamp >= start_date)
+    if end_date is not None:
+        query = query.where(Expense.timestamp <= end_date)
+    return query.order_by(Expense.timestamp.desc())
+
+
+async def stream_expense_rows(user_id, start_date=None, end_date=None, batch_size=EXPORT_BATCH_SIZE):
+    """Yields lists of (timestamp, category, description, amount, id), newest first."""
+    async with AsyncSessionLocal() as session:
+        result = await session.stream(
+            export_query(user_id, start_date, end_date).execution_options(yield_per=batch_size)
+        )
+        async for batch in result.partitions():
+            yield batch
+
+
+async def archived_summaries(user_id, start_date=None, end_date=None):
+    """
+    (year_month, category, total, count) of the user's archived months overlapping
+    the range, newest month first. Export periods are whole months, so these
+    complete the streamed rows exactly.
+    """
+    query = select(
+        ExpenseArchive.year_month, ExpenseArchive.category, ExpenseArchive.total, ExpenseArchive.count
+    ).where(ExpenseArchive.user_id == user_id)
+    if start_date is not None:
+        query = query.where(ExpenseArchive.year_month >= year_month(start_date))
+    if end_date is not None:
+        query = query.where(ExpenseArchive.year_month <= year_month(end_date))
+    query = query.order_by(ExpenseArchive.year_month.desc(), ExpenseArchive.category)
+
+    async with AsyncSessionLocal() as session:
+        return (await session.execute(query)).all()
@@ -0,0 +1,116 @@
+"""
+aiogram FSM storage kept in the bot's database, so half-finished conversations
+survive restarts and can be shared by several bot processes.
+
+aiogram reads the state once at the start of every update; that read always goes
+to the database (one primary-key lookup) and refreshes a small in-process cache
+which serves the rest of the update (get_data, update_data, ...). Writes go to the
+database immediately. Rows untouched for longer than FSM_STATE_TTL_HOURS are
+treated as empty and removed by `cleanup`.
+"""
+import os
+import json
+import time
+import asyncio
+import logging
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, DefaultKeyBuilder
+from sqlalchemy import select, delete
+from data.database import AsyncSessionLocal, FsmState
+from data.rollups import upsert
+
+logger = logging.getLogger(__name__)
+
+FSM_STATE_TTL_HOURS = int(os.getenv("FSM_STATE_TTL_HOURS", 48))
+FSM_CACHE_SIZE = int(os.getenv("FSM_CACHE_SIZE", 10000))
+FSM_CACHE_SECONDS = 30
+CLEANUP_INTERVAL_SECONDS = 3600
+
+
+class SQLAlchemyStorage(BaseStorage):
+    def __init__(self, session_maker=AsyncSessionLocal, key_builder=None,
+                 state_ttl=timedelta(hours=FSM_STATE_TTL_HOURS), cache_size=FSM_CACHE_SIZE):
+        self.session_maker = session_maker
+        self.key_builder = key_builder or DefaultKeyBuilder(with_destiny=True)
+        self.state_ttl = state_ttl
+        self.cache_size = cache_size
+        self._cache = OrderedDict() # key -> (loaded_at, state, data)
+
+    def _remember(self, key, state, data):
+        self._cache[key] = (time.monotonic(), state, data)
+        self._cache.move_to_end(key)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    async def _load(self, key, refresh=False):
+        cached = self._cache.get(key)
+        if cached and not refresh and time.monotonic() - cached[0] < FSM_CACHE_SECONDS:
+            return cached[1], cached[2]
+
+        async with self.session_maker() as session:
+            row = (await session.execute(
+                select(FsmState.state, FsmState.data, FsmState.updated_at).where(FsmState.key == key)
+            )).one_or_none()
+
+        state, data = None, {}
+        if row and row.updated_at >= datetime.utcnow() - self.state_ttl:
+            state, data = row.state, json.loads(row.data or "{}")
+        self._remember(key, state, data)
+        return state, data
+
+    async def _save(self, key, state, data):
+        async with self.session_maker() as session:
+            if state is None and not data:
+                # Nothing left to remember, keep the table small
+                await session.execute(delete(FsmState).where(FsmState.key == key))
+            else:
+                values = {"key": key, "state": state, "data": json.dumps(data), "updated_at": datetime.utcnow()}
+                stmt = upsert(session.bind.dialect.name, FsmState).values(**values)
+                stmt = stmt.on_conflict_do_update(index_elements=["key"], set_=values)
+                await session.execute(stmt)
+            await session.commit()
+        self._remember(key, state, data)
+
+    async def set_state(self, key, state=None):
+        storage_key = self.key_builder.build(key)
+        state = state.state if isinstance(state, State) else state
+        _, data = await self._load(storage_key)
+        await self._save(storage_key, state, data)
+
+    async def get_state(self, key):
+        # Called once per update by the FSM middleware -> the one real lookup
+        state, _ = await self._load(self.key_builder.build(key), refresh=True)
+        return state
+
+    async def set_data(self, key, data):
+        storage_key = self.key_builder.build(key)
+        state, _ = await self._load(storage_key)
+        await self._save(storage_key, state, dict(data))
+
+    async def get_data(self, key):
+        _, data = await self._load(self.key_builder.build(key))
+        return dict(data)
+
+    async def close(self):
+        self._cache.clear()
+
+    async def cleanup(self):
+        """Deletes states nobody touched within the TTL. Returns the number removed."""
+        async with self.session_maker() as session:
+            result = await session.execute(
+                delete(FsmState).where(FsmState.updated_at < datetime.utcnow() - self.state_ttl)
+            )
+            await session.commit()
+        return result.rowcount
+
+    async def run_cleanup(self, interval=CLEANUP_INTERVAL_SECONDS):
+        while True:
+            try:
+                removed = await self.cleanup()
+                if removed:
+                    logger.info("Removed %d stale FSM states", removed)
+            except Exception:
+                logger.exception("FSM state cleanup failed")
+            await asyncio.sleep(interval)
@@ -0,0 +1,65 @@
+"""
+Keyset pagination of a user's expenses for the History view.
+
+Pages are anchored on the (timestamp, id) of an expense already shown instead of an
+OFFSET, so every page is one index range scan of `ix_expenses_user_id_timestamp_id`,
+no matter how far back the user has paged.
+"""
+from datetime import datetime
+from sqlalchemy import select, tuple_, func
+from data.database import AsyncSessionLocal, Expense
+
+HISTORY_PAGE_SIZE = 10
+
+
+def month_range(year_month):
+    """"2024-03" -> (2024-03-01, 2024-04-01)"""
+    year, month = map(int, year_month.split("-"))
+    start = datetime(year, month, 1)
+    end = datetime(year + month // 12, month % 12 + 1, 1)
+    return start, end
+
+
+def history_page_query(user_id, older_than=None, newer_than=None, category=None, month=None, limit=HISTORY_PAGE_SIZE):
+    """
+    One page of (id, timestamp, category, amount).
+    `older_than`/`newer_than` are (timestamp, id) keys of an expense already shown.
+    Newest first, except for `newer_than` pages which come back oldest first.
+    """
+    key = tuple_(Expense.timestamp, Expense.id)
+    query = select(Expense.id, Expense.timestamp, Expense.category, Expense.amount).where(
+        Expense.user_id == user_id
+    )
+    if category is not None:
+        query = query.where(func.lower(Expense.category) == category.lower())
+    if month is not None:
+        start, end = month_range(month)
+        query = query.where(Expense.timestamp >= start, Expense.timestamp < end)
+
+    if newer_than is not None:
+        query = query.where(key > tuple_(*newer_than)).order_by(Expense.timestamp, Expense.id)
+    else:
+        if older_than is not None:
+            query = query.where(key < tuple_(*older_than))
+        query = query.order_by(Expense.timestamp.desc(), Expense.id.desc())
+    return query.limit(limit)
+
+
+async def fetch_history_page(user_id, older_than=None, newer_than=None, category=None, month=None,
+                             page_size=HISTORY_PAGE_SIZE):
+    """
+    Returns (rows newest first, has_older, has_newer).
+    One extra row is fetched to know whether there is another page in the paging direction;
+    the opposite direction is where the user came from.
+    """
+    async with AsyncSessionLocal() as session:
+        result = await session.execute(
+            history_page_query(user_id, older_than, newer_than, category, month, limit=page_size + 1)
+        )
+        rows = result.all()
+
+    more = len(rows) > page_size
+    rows = rows[:page_size]
+    if newer_than is not None:
+        return rows[::-1], True, more
+    return rows, more, older_than is not None
@@ -0,0 +1,159 @@
+"""
+Versioned schema migrations.
+
+`create_all` only creates missing tables, so anything that changes an existing
+table (new indexes, new columns) is added here as a numbered step. Each step
+runs once per database and is recorded in the `schema_version` table.
+Steps must work on both SQLite and Postgres and be safe on a fresh database
+where `create_all` already built the latest schema.
+"""
+import logging
+from datetime import datetime
+from sqlalchemy import select, update, inspect, text, func, literal
+from data.database import Expense, Subscription, SubscriptionCharge, SchemaVersion, ExpenseRollup, MonthlyTotal
+from data.rollups import rebuild_statements, year_month, year_month_expr
+from data.partitions import add_months, month_start
+from data.subscription_charges import SUBSCRIPTION_CATEGORY
+
+logger = logging.getLogger(__name__)
+
+
+def _create_missing_indexes(conn, table):
+    existing = {ix["name"] for ix in inspect(conn).get_indexes(table.name)}
+    for index in table.indexes:
+        if index.name not in existing:
+            index.create(conn)
+
+
+def _add_user_indexes(conn):
+    _create_missing_indexes(conn, Expense.__table__)
+    _create_missing_indexes(conn, Subscription.__table__)
+
+
+def _add_id_to_history_index(conn):
+    # History pages are keyed on (timestamp, id); with id in the index they need no sort step
+    conn.execute(text("DROP INDEX IF EXISTS ix_expenses_user_id_timestamp"))
+    _create_missing_indexes(conn, Expense.__table__)
+
+
+def _partitioning_hint(conn):
+    # Copying a big table would hold up the start of the bot, so partitioning is a
+    # separate offline step (this version used to do it here)
+    if conn.dialect.name == "postgresql":
+        logger.info("To partition expenses by month, stop the bot and run: python -m scripts.partition_expenses")
+
+
+def _add_subscription_billing(conn):
+    columns = {c["name"] for c in inspect(conn).get_columns("subscriptions")}
+    if "billing_day" not in columns:
+        conn.execute(text("ALTER TABLE subscriptions ADD COLUMN billing_day INTEGER NOT NULL DEFAULT 1"))
+    if "starts_month" not in columns:
+        conn.execute(text("ALTER TABLE subscriptions ADD COLUMN starts_month VARCHAR(7)"))
+    # Existing subscriptions were counted as fixed costs so far; charge them from next month on
+    conn.execute(
+        update(Subscription).where(Subscription.starts_month.is_(None))
+        .values(starts_month=year_month(add_months(month_start(datetime.utcnow()), 1)))
+    )
+
+
+def _backfill_month_totals(conn):
+    conn.execute(MonthlyTotal.__table__.insert().from_select(
+        ["user_id", "year_month", "total", "alerted"],
+        select(ExpenseRollup.user_id, ExpenseRollup.year_month, func.sum(ExpenseRollup.total), literal(0))
+        .group_by(ExpenseRollup.user_id, ExpenseRollup.year_month)
+    ))
+
+
+def _add_expense_subscription_id(conn):
+    columns = {c["name"] for c in inspect(conn).get_columns("expenses")}
+    if "subscription_id" not in columns:
+        conn.execute(text("ALTER TABLE expenses ADD COLUMN subscription_id INTEGER"))
+
+    # Charges made so far: the ledger entry of the same subscription (name, amount) and month
+    first_month = conn.execute(select(func.min(SubscriptionCharge.year_month))).scalar()
+    if first_month is None:
+        return
+    charged = (
+        select(Subscription.id)
+        .join(SubscriptionCharge, SubscriptionCharge.subscription_id == Subscription.id)
+        .where(
+            Subscription.user_id == Expense.user_id,
+            Subscription.name == Expense.description,
+            Subscription.amount == Expense.amount,
+            SubscriptionCharge.year_month == year_month_expr(conn.dialect.name),
+        )
+        .limit(1)
+        .scalar_subquery()
+    )
+    conn.execute(
+        update(Expense)
+        .where(
+            Expense.category == SUBSCRIPTION_CATEGORY,
+            Expense.subscription_id.is_(None),
+            Expense.timestamp >= datetime.strptime(first_month, "%Y-%m"),
+        )
+        .values(subscription_id=charged)
+    )
+
+
+def _subscription_ids_never_reused(conn):
+    # Postgres sequences never hand out an id twice; SQLite needs AUTOINCREMENT, which
+    # only a rebuilt table can get
+    if conn.dialect.name != "sqlite":
+        return
+    table_sql = conn.execute(text("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'subscriptions'")).scalar()
+    if "AUTOINCREMENT" in table_sql.upper():
+        return
+
+    columns = ", ".join(c.name for c in Subscription.__table__.columns)
+    conn.execute(text("ALTER TABLE subscriptions RENAME TO subscriptions_old"))
+    for index in inspect(conn).get_indexes("subscriptions_old"):
+        conn.execute(text(f"DROP INDEX {index['name']}"))
+    Subscription.__table__.create(conn)
+    conn.execute(text(f"INSERT INTO subscriptions ({columns}) SELECT {columns} FROM subscriptions_old"))
+    conn.execute(text("DROP TABLE subscriptions_old"))
+    # Continue after every id ever used, also by subscriptions deleted before this step
+    last_id = conn.execute(text(
+        "SELECT max(coalesce((SELECT max(id) FROM subscriptions), 0), "
+        "coalesce((SELECT max(subscription_id) FROM expenses), 0), "
+        "coalesce((SELECT max(subscription_id) FROM subscription_charges), 0))"
+    )).scalar()
+    conn.execute(text("DELETE FROM sqlite_sequence WHERE name = 'subscriptions'"))
+    conn.execute(text("INSERT INTO sqlite_sequence (name, seq) VALUES ('subscriptions', :seq)"), {"seq": last_id})
+
+
+def _backfill_rollups(conn):
+    for statement in rebuild_statements(conn.dialect.name):
+        conn.execute(statement)
+
+
+# (version, description, step). Append only, never renumber.
+MIGRATIONS = [
+    (1, "Index expenses(user_id, timestamp DESC) and subscriptions(user_id)", _add_user_indexes),
+    (2, "Backfill expense_rollups from existing expenses", _backfill_rollups),
+    (3, "Index expenses(user_id, timestamp DESC, id DESC) for keyset pagination", _add_id_to_history_index),
+    (4, "Monthly partitioning of expenses moved to scripts/partition_expenses.py", _partitioning_hint),
+    (5, "Add subscriptions.billing_day and starts_month", _add_subscription_billing),
+    (6, "Backfill monthly_totals from expense_rollups", _backfill_month_totals),
+    (7, "Add expenses.subscription_id to mark subscription charges", _add_expense_subscription_id),
+    (8, "Never reuse the ids of deleted subscriptions (SQLite AUTOINCREMENT)", _subscription_ids_never_reused),
+]
+
+
+def run_migrations(conn):
+    """
+    Applies every migration newer than the recorded schema version.
+    Runs inside the caller's transaction (see `init_db`).
+    """
+    applied = set(conn.execute(select(SchemaVersion.version)).scalars())
+
+    for version, description, step in MIGRATIONS:
+        if version in applied:
+            continue
+        logger.info("Applying migration %s: %s", version, description)
+        step(conn)
+        conn.execute(
+            SchemaVersion.__table__.insert().values(
+                version=version, description=description, applied_at=datetime.utcnow()
+            )
+        )
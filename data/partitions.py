@@ -0,0 +1,165 @@
+"""
+Monthly range partitioning of `expenses` on Postgres.
+
+scripts/partition_expenses.py turns `expenses` into a table partitioned by month
+on `timestamp`, one `expenses_pYYYY_MM` partition per month, while the bot is
+stopped. There is no default partition (it would rule out detaching partitions
+concurrently, see data/archive.py): partitions from last month to
+PARTITION_MONTHS_AHEAD months ahead are created at startup and by the daily
+archival run, and inserts of other months create theirs first
+(`ensure_partitions_for`). Everything here is a no-op on SQLite and on an
+unpartitioned Postgres table.
+
+Functions take a sync Connection (use `conn.run_sync` from async code).
+"""
+import os
+import re
+import logging
+from datetime import datetime
+from sqlalchemy import text
+
+logger = logging.getLogger(__name__)
+
+PARTITION_MONTHS_AHEAD = int(os.getenv("PARTITION_MONTHS_AHEAD", 3))
+
+PARTITION_NAME = re.compile(r"^expenses_p(\d{4})_(\d{2})$")
+# Name of the original table while scripts/partition_expenses.py copies it
+UNPARTITIONED = "expenses_unpartitioned"
+
+
+def add_months(month_start, months):
+    index = month_start.year * 12 + month_start.month - 1 + months
+    return datetime(index // 12, index % 12 + 1, 1)
+
+
+def month_start(timestamp):
+    return datetime(timestamp.year, timestamp.month, 1)
+
+
+def partition_name(month):
+    return f"expenses_p{month:%Y_%m}"
+
+
+def _month_of(name):
+    match = PARTITION_NAME.match(name)
+    return datetime(int(match.group(1)), int(match.group(2)), 1) if match else None
+
+
+def is_partitioned(conn):
+    return bool(conn.execute(text("SELECT relkind = 'p' FROM pg_class WHERE relname = 'expenses'")).scalar())
+
+
+def month_partitions(conn):
+    """{month start: partition name} of the monthly partitions attached to `expenses`."""
+    names = conn.execute(text(
+        "SELECT c.relname FROM pg_inherits i "
+        "JOIN pg_class c ON c.oid = i.inhrelid JOIN pg_class p ON p.oid = i.inhparent "
+        "WHERE p.relname = 'expenses'"
+    )).scalars()
+    return {_month_of(name): name for name in names if _month_of(name)}
+
+
+def month_tables(conn):
+    """
+    {month start: (table name, state)} of every monthly table, state being "attached",
+    "detaching" (an interrupted DETACH ... CONCURRENTLY) or "detached".
+    """
+    rows = conn.execute(text(
+        "SELECT c.relname, i.inhdetachpending FROM pg_class c "
+        "LEFT JOIN pg_inherits i ON i.inhrelid = c.oid AND i.inhparent = 'expenses'::regclass "
+        "WHERE c.relkind = 'r' AND c.relname LIKE 'expenses\\_p%' AND pg_table_is_visible(c.oid)"
+    )).all()
+    states = {None: "detached", False: "attached", True: "detaching"}
+    return {_month_of(name): (name, states[pending]) for name, pending in rows if _month_of(name)}
+
+
+def create_month_partitions(conn, months):
+    existing = month_partitions(conn)
+    for month in sorted(set(months) - set(existing)):
+        try:
+            with conn.begin_nested():
+                conn.execute(text(
+                    f"CREATE TABLE {partition_name(month)} PARTITION OF expenses "
+                    f"FOR VALUES FROM ('{month:%Y-%m-%d}') TO ('{add_months(month, 1):%Y-%m-%d}')"
+                ))
+        except Exception:
+            # e.g. a detached table of that month is still waiting to be archived
+            logger.exception("Could not create partition %s", partition_name(month))
+
+
+def partition_window(now=None):
+    """Months that always have a partition: last month (late subscription charges) to PARTITION_MONTHS_AHEAD."""
+    this_month = month_start(now or datetime.utcnow())
+    return [add_months(this_month, n) for n in range(-1, PARTITION_MONTHS_AHEAD + 1)]
+
+
+def ensure_future_partitions(conn):
+    if conn.dialect.name != "postgresql" or not is_partitioned(conn):
+        return
+    create_month_partitions(conn, partition_window())
+
+
+def ensure_partitions_for(conn, timestamps):
+    """Creates the partitions of months outside `partition_window` that `timestamps` fall in (e.g. CSV imports)."""
+    months = {month_start(ts) for ts in timestamps if ts is not None} - set(partition_window())
+    if not months or conn.dialect.name != "postgresql" or not is_partitioned(conn):
+        return
+    create_month_partitions(conn, months)
+
+
+def start_partitioning(conn):
+    """
+    First step of scripts/partition_expenses.py: moves `expenses` aside and creates the
+    partitioned table (same columns, PK (id, timestamp)) with a partition for every month
+    that has data. Returns False if `expenses` is already partitioned.
+    """
+    if is_partitioned(conn):
+        return False
+
+    # Rows need a timestamp to have a partition
+    conn.execute(text("UPDATE expenses SET timestamp = now() AT TIME ZONE 'utc' WHERE timestamp IS NULL"))
+    conn.execute(text(f"ALTER TABLE expenses RENAME TO {UNPARTITIONED}"))
+    conn.execute(text(f"ALTER TABLE {UNPARTITIONED} RENAME CONSTRAINT expenses_pkey TO {UNPARTITIONED}_pkey"))
+    conn.execute(text(f"ALTER INDEX IF EXISTS ix_expenses_user_id_timestamp_id RENAME TO ix_{UNPARTITIONED}_tmp"))
+
+    # Same columns and defaults (id keeps its sequence); the partition key has to be part of the primary key
+    conn.execute(text(
+        f"CREATE TABLE expenses (LIKE {UNPARTITIONED} INCLUDING DEFAULTS) PARTITION BY RANGE (timestamp)"
+    ))
+    conn.execute(text("ALTER TABLE expenses ALTER COLUMN timestamp SET NOT NULL"))
+    conn.execute(text("ALTER TABLE expenses ADD PRIMARY KEY (id, timestamp)"))
+    conn.execute(text(
+        "CREATE INDEX ix_expenses_user_id_timestamp_id ON expenses (user_id, timestamp DESC, id DESC)"
+    ))
+
+    months_with_data = conn.execute(text(
+        f"SELECT DISTINCT date_trunc('month', timestamp) FROM {UNPARTITIONED}"
+    )).scalars()
+    create_month_partitions(conn, [month_start(m) for m in months_with_data] + partition_window())
+    return True
+
+
+def copy_batch(conn, batch_size):
+    """Copies the next `batch_size` rows (by id) into the partitioned table. Returns the number copied."""
+    after = conn.execute(text("SELECT coalesce(max(id), 0) FROM expenses")).scalar()
+    last = conn.execute(text(
+        f"SELECT max(id) FROM (SELECT id FROM {UNPARTITIONED} WHERE id > :after ORDER BY id LIMIT :n) batch"
+    ), {"after": after, "n": batch_size}).scalar()
+    if last is None:
+        return 0
+    return conn.execute(text(
+        f"INSERT INTO expenses SELECT * FROM {UNPARTITIONED} WHERE id > :after AND id <= :last"
+    ), {"after": after, "last": last}).rowcount
+
+
+def finish_partitioning(conn):
+    """Last step: hands the id sequence over to the new table and drops the old one."""
+    sequence = conn.execute(text(f"SELECT pg_get_serial_sequence('{UNPARTITIONED}', 'id')")).scalar()
+    if sequence:
+        conn.execute(text(f"ALTER SEQUENCE {sequence} OWNED BY expenses.id"))
+    conn.execute(text(f"DROP TABLE {UNPARTITIONED}"))
+    conn.execute(text("ANALYZE expenses"))
+
+
+def partitioning_in_progress(conn):
+    return conn.execute(text(f"SELECT to_regclass('{UNPARTITIONED}') IS NOT NULL")).scalar()
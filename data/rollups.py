@@ -0,0 +1,208 @@
+"""
+Maintenance of the `expense_rollups` table: (user, month, category) -> total, count.
+
+Every code path that inserts or deletes expenses calls `add_to_rollups` /
+`remove_from_rollups` with the same session *before* committing, so the rollup
+always changes in the same transaction as the rows it summarizes.
+The same calls keep `monthly_totals`, each user's running total per month that
+budget alerts are based on; `reconcile_month_totals` recomputes it from `expenses`.
+Archiving old expenses (data/archive.py) leaves the rollups untouched: the
+removed rows live on as summaries in `expense_archive`.
+"""
+from collections.abc import Mapping
+from datetime import datetime
+from sqlalchemy import select, delete, func, literal, literal_column, union_all, String
+from data.database import Expense, ExpenseRollup, ExpenseArchive, MonthlyTotal
+
+
+def year_month(timestamp):
+    return timestamp.strftime("%Y-%m")
+
+
+def year_month_expr(dialect_name, column=Expense.timestamp):
+    """SQL expression turning a timestamp column into a 'YYYY-MM' string."""
+    if dialect_name == "postgresql":
+        return func.to_char(column, literal_column("'YYYY-MM'"))
+    return func.strftime(literal_column("'%Y-%m'"), column)
+
+
+def upsert(dialect_name, table):
+    """Dialect specific INSERT supporting `on_conflict_do_update`."""
+    # Imported on demand: only the dialect actually in use gets loaded
+    if dialect_name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    return insert(table)
+
+
+def _fields(expense):
+    # Accepts ORM Expense objects as well as plain row mappings
+    if isinstance(expense, Mapping):
+        return expense["user_id"], expense["timestamp"], expense["category"], expense["amount"]
+    return expense.user_id, expense.timestamp, expense.category, expense.amount
+
+
+async def _apply(session, expenses, sign, table=ExpenseRollup):
+    deltas = {}
+    for expense in expenses:
+        user_id, timestamp, category, amount = _fields(expense)
+        key = (user_id, year_month(timestamp or datetime.utcnow()), category)
+        total, count = deltas.get(key, (0.0, 0))
+        deltas[key] = (total + sign * amount, count + sign)
+
+    if not deltas:
+        return
+
+    rows = [
+        {"user_id": user_id, "year_month": ym, "category": category, "total": total, "count": count}
+        for (user_id, ym, category), (total, count) in deltas.items()
+    ]
+    stmt = upsert(session.bind.dialect.name, table)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["user_id", "year_month", "category"],
+        set_={
+            "total": table.total + stmt.excluded.total,
+            "count": table.count + stmt.excluded.count,
+        },
+    )
+    await session.execute(stmt, rows)
+
+    if sign < 0:
+        # Drop buckets that no longer contain any expense
+        user_ids = {user_id for user_id, _, _ in deltas}
+        await session.execute(
+            delete(table).where(table.user_id.in_(user_ids), table.count <= 0)
+        )
+
+    if table is ExpenseRollup:
+        await _apply_month_totals(session, deltas)
+
+
+async def _apply_month_totals(session, deltas):
+    month_deltas = {}
+    for (user_id, ym, _), (total, _) in deltas.items():
+        month_deltas[(user_id, ym)] = month_deltas.get((user_id, ym), 0.0) + total
+
+    stmt = upsert(session.bind.dialect.name, MonthlyTotal)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["user_id", "year_month"],
+        set_={"total": MonthlyTotal.total + stmt.excluded.total},
+    )
+    # Rows are kept when a month drops to zero: `alerted` must survive a delete + re-add
+    await session.execute(stmt, [
+        {"user_id": user_id, "year_month": ym, "total": total}
+        for (user_id, ym), total in month_deltas.items()
+    ])
+
+
+async def add_to_rollups(session, expenses):
+    await _apply(session, expenses, 1)
+
+
+async def remove_from_rollups(session, expenses):
+    await _apply(session, expenses, -1)
+
+
+async def add_to_archive(session, expenses):
+    """Adds expenses to the archived monthly summaries (same buckets as the rollups)."""
+    await _apply(session, expenses, 1, ExpenseArchive)
+
+
+def category_totals_query(user_id, first_month, last_month):
+    """
+    (category, total, count) per category for the months in [first_month, last_month],
+    biggest first. Aggregated by the database, so only one tuple per category comes back.
+    """
+    total = func.sum(ExpenseRollup.total)
+    return (
+        select(ExpenseRollup.category, total.label("total"), func.sum(ExpenseRollup.count).label("count"))
+        .where(
+            ExpenseRollup.user_id == user_id,
+            ExpenseRollup.year_month >= first_month,
+            ExpenseRollup.year_month <= last_month
+        )
+        .group_by(ExpenseRollup.category)
+        .order_by(total.desc())
+    )
+
+
+async def category_totals(session, user_id, first_month, last_month):
+    result = await session.execute(category_totals_query(user_id, first_month, last_month))
+    return result.all()
+
+
+def rebuild_statements(dialect_name, user_id=None):
+    """
+    DELETE + INSERT ... SELECT recomputing the rollups from `expenses` plus the
+    summaries of archived months in `expense_archive`, for one user or
+    (user_id=None) for everybody.
+    """
+    ym = year_month_expr(dialect_name)
+    live = select(
+        Expense.user_id.label("user_id"), ym.label("year_month"), Expense.category.label("category"),
+        func.sum(Expense.amount).label("total"), func.count().label("count")
+    ).group_by(Expense.user_id, ym, Expense.category)
+    archived = select(
+        ExpenseArchive.user_id, ExpenseArchive.year_month, ExpenseArchive.category,
+        ExpenseArchive.total, ExpenseArchive.count
+    )
+    clear = delete(ExpenseRollup)
+
+    if user_id is not None:
+        live = live.where(Expense.user_id == user_id)
+        archived = archived.where(ExpenseArchive.user_id == user_id)
+        clear = clear.where(ExpenseRollup.user_id == user_id)
+
+    # A month can be partly archived (e.g. old rows imported after archiving)
+    combined = union_all(live, archived).subquery()
+    aggregated = select(
+        combined.c.user_id, combined.c.year_month, combined.c.category,
+        func.sum(combined.c.total), func.sum(combined.c.count)
+    ).group_by(combined.c.user_id, combined.c.year_month, combined.c.category)
+
+    fill = ExpenseRollup.__table__.insert().from_select(
+        ["user_id", "year_month", "category", "total", "count"], aggregated
+    )
+    return [clear, fill]
+
+
+async def reconcile_month_totals(session, month_start, next_month_start):
+    """
+    Corrects every user's running total of one month to the sum of their expenses in it.
+    Only that month's rows are read (one partition on Postgres); `alerted` is kept.
+    Returns the number of users whose total had drifted.
+
+    One INSERT ... SELECT ... ON CONFLICT: the expenses and the stored totals are read
+    in the same snapshot, so an expense committed meanwhile is in both or in neither.
+    The drift is added to the current total rather than overwriting it, which keeps
+    updates committed after that snapshot.
+    """
+    ym = year_month(month_start)
+    actual = (
+        select(Expense.user_id.label("user_id"), func.sum(Expense.amount).label("delta"))
+        .where(Expense.timestamp >= month_start, Expense.timestamp < next_month_start)
+        .group_by(Expense.user_id)
+    )
+    stored = select(MonthlyTotal.user_id, -MonthlyTotal.total).where(MonthlyTotal.year_month == ym)
+    both = union_all(actual, stored).subquery()
+    drift = (
+        select(both.c.user_id, literal(ym, String), func.sum(both.c.delta), literal(0))
+        .group_by(both.c.user_id)
+        .having(func.abs(func.sum(both.c.delta)) > 0.005)
+    )
+
+    stmt = upsert(session.bind.dialect.name, MonthlyTotal).from_select(
+        ["user_id", "year_month", "total", "alerted"], drift
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["user_id", "year_month"],
+        set_={"total": MonthlyTotal.total + stmt.excluded.total},
+    )
+    result = await session.execute(stmt.returning(MonthlyTotal.user_id))
+    return len(result.all())
+
+
+async def rebuild_rollups(session, user_id=None):
+    for statement in rebuild_statements(session.bind.dialect.name, user_id):
+        await session.execute(statement)
@@ -0,0 +1,109 @@
+"""
+Monthly charges of subscriptions, materialized as expenses.
+
+Every run charges, for all users at once, the subscriptions whose billing day of
+the month has come: one INSERT ... SELECT claims them in the `subscription_charges`
+ledger (one row per subscription and month, ON CONFLICT DO NOTHING ... RETURNING)
+and a second one copies the claimed subscriptions into `expenses` (category
+"Subscriptions", `subscription_id` set) in the same transaction.
+A subscription already in the ledger for that month is never charged again, so
+re-runs, restarts and concurrent runs cannot double-charge.
+
+The scheduler runs at startup and then every day just after midnight UTC, so each
+billing day gets a run. After each run it hands the charged users to `on_charged`
+(budget alerts, utils/budget_alerts.py). The previous month is checked too, which catches up on
+charges missed while the bot was down over a month boundary.
+"""
+import asyncio
+import calendar
+import logging
+from datetime import datetime, timedelta
+from sqlalchemy import select, case, literal, or_, exists, String
+from data.database import AsyncSessionLocal, Expense, Subscription, SubscriptionCharge
+from data.partitions import add_months, month_start
+from data.rollups import add_to_rollups, upsert, year_month
+
+logger = logging.getLogger(__name__)
+
+SUBSCRIPTION_CATEGORY = "Subscriptions"
+
+
+def billing_date(month, billing_day):
+    """Billing date of a month; days past the end of a short month fall on its last day."""
+    _, days_in_month = calendar.monthrange(month.year, month.month)
+    return datetime(month.year, month.month, min(billing_day, days_in_month))
+
+
+def first_billing_month(billing_day, now=None):
+    """'YYYY-MM' of the first charge of a subscription added now: this month if its day is still ahead."""
+    now = now or datetime.utcnow()
+    this_month = month_start(now)
+    if now < billing_date(this_month, billing_day):
+        return year_month(this_month)
+    return year_month(add_months(this_month, 1))
+
+
+async def _charge_month(session, month, today):
+    ym = year_month(month)
+    _, days_in_month = calendar.monthrange(month.year, month.month)
+    day = case((Subscription.billing_day > days_in_month, days_in_month), else_=Subscription.billing_day)
+
+    due = [
+        or_(Subscription.starts_month.is_(None), Subscription.starts_month <= ym),
+        ~exists().where(SubscriptionCharge.subscription_id == Subscription.id, SubscriptionCharge.year_month == ym),
+    ]
+    if month_start(today) == month:
+        due.append(day <= today.day)
+
+    claim = upsert(session.bind.dialect.name, SubscriptionCharge).from_select(
+        ["subscription_id", "year_month", "charged_at"],
+        select(Subscription.id, literal(ym, String), literal(datetime.utcnow())).where(*due),
+    ).on_conflict_do_nothing(index_elements=["subscription_id", "year_month"])
+    claimed = (await session.execute(claim.returning(SubscriptionCharge.subscription_id))).scalars().all()
+    if not claimed:
+        return []
+
+    # Only what this run claimed is turned into expenses
+    charged_on = case({d: datetime(month.year, month.month, d) for d in range(1, days_in_month + 1)}, value=day)
+    charges = select(
+        Subscription.user_id, Subscription.amount, literal(SUBSCRIPTION_CATEGORY, String), Subscription.name,
+        charged_on, Subscription.id,
+    ).where(Subscription.id.in_(claimed))
+    result = await session.execute(
+        Expense.__table__.insert()
+        .from_select(["user_id", "amount", "category", "description", "timestamp", "subscription_id"], charges)
+        .returning(Expense.user_id, Expense.timestamp, Expense.category, Expense.amount)
+    )
+    created = result.mappings().all()
+    await add_to_rollups(session, created)
+    return [row["user_id"] for row in created]
+
+
+async def charge_due_subscriptions(now=None):
+    """Charges every due, not yet charged subscription. Returns the user id of every expense created."""
+    now = now or datetime.utcnow()
+    this_month = month_start(now)
+    charged = []
+    async with AsyncSessionLocal() as session:
+        for month in (add_months(this_month, -1), this_month):
+            charged += await _charge_month(session, month, now)
+        await session.commit()
+    return charged
+
+
+async def run_subscription_scheduler(on_charged=None):
+    """
+    Runs `charge_due_subscriptions` now and then daily at 00:01 UTC.
+    `on_charged(user_ids)` is awaited with the distinct users charged by a run.
+    """
+    while True:
+        try:
+            charged = await charge_due_subscriptions()
+            logger.info("Subscription run: %d charge(s) created", len(charged))
+            if charged and on_charged is not None:
+                await on_charged(sorted(set(charged)))
+        except Exception:
+            logger.exception("Subscription charging failed")
+        now = datetime.utcnow()
+        next_run = datetime(now.year, now.month, now.day) + timedelta(days=1, minutes=1)
+        await asyncio.sleep((next_run - now).total_seconds())
@@ -0,0 +1,105 @@
+"""
+In-process cache of the rarely changing per-user settings: budget limit and
+subscriptions (with their fixed-cost total).
+
+Entries expire after USER_CACHE_TTL seconds and the least recently used ones are
+evicted beyond USER_CACHE_SIZE. Handlers that change a budget or a subscription
+call `invalidate(user_id)` right after committing.
+
+Invalidation only reaches the cache of the process that made the change. With
+several bot instances on one database, the others keep serving the old budget
+and subscriptions (Forecast, Stats, budget alerts) until their entry expires, so
+run them with a short USER_CACHE_TTL (a few seconds).
+"""
+import os
+import time
+from collections import OrderedDict
+from typing import NamedTuple
+from sqlalchemy import select, literal, Integer
+from data.database import AsyncSessionLocal, User, Subscription
+
+USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", 10000))
+USER_CACHE_TTL = int(os.getenv("USER_CACHE_TTL", 300))
+
+
+class UserProfile(NamedTuple):
+    budget_limit: float | None # None when the user never set a budget
+    subscriptions: tuple # ((id, name, amount, starts_month), ...)
+    fixed_costs: float # all subscriptions, per month
+
+    def fixed_costs_in(self, month):
+        """Monthly cost of the subscriptions charged in `month` ('YYYY-MM'): new ones may start later."""
+        return sum(amount for _, _, amount, starts in self.subscriptions if starts is None or starts <= month)
+
+
+_cache = OrderedDict() # user_id -> (expires_at, UserProfile)
+hits = 0
+misses = 0
+
+
+def profile_query(user_id):
+    """Budget and every subscription of a user in one round trip (one row per subscription)."""
+    me = select(literal(user_id, Integer).label("user_id")).subquery()
+    return (
+        select(User.budget_limit, Subscription.id, Subscription.name, Subscription.amount, Subscription.starts_month)
+        .select_from(me)
+        .outerjoin(User, User.user_id == me.c.user_id)
+        .outerjoin(Subscription, Subscription.user_id == me.c.user_id)
+        .order_by(Subscription.id)
+    )
+
+
+def profile_from_rows(rows):
+    """UserProfile from the (budget_limit, subscription id, name, amount, starts_month) rows of `profile_query`."""
+    subscriptions = tuple(sorted(tuple(row[1:]) for row in rows if row[1] is not None))
+    return UserProfile(
+        budget_limit=rows[0][0] if rows else None,
+        subscriptions=subscriptions,
+        fixed_costs=sum(amount for _, _, amount, _ in subscriptions),
+    )
+
+
+async def _load(session, user_id):
+    return profile_from_rows((await session.execute(profile_query(user_id))).all())
+
+
+def cached_profile(user_id):
+    """The cached profile, or None (counted as a miss) when it has to be loaded and `remember`ed."""
+    global hits, misses
+
+    cached = _cache.get(user_id)
+    if cached and cached[0] > time.monotonic():
+        hits += 1
+        _cache.move_to_end(user_id)
+        return cached[1]
+    misses += 1
+    return None
+
+
+def remember(user_id, profile):
+    _cache[user_id] = (time.monotonic() + USER_CACHE_TTL, profile)
+    _cache.move_to_end(user_id)
+    while len(_cache) > USER_CACHE_SIZE:
+        _cache.popitem(last=False)
+
+
+async def get_user_profile(user_id, session=None):
+    profile = cached_profile(user_id)
+    if profile is not None:
+        return profile
+
+    if session is None:
+        async with AsyncSessionLocal() as session:
+            profile = await _load(session, user_id)
+    else:
+        profile = await _load(session, user_id)
+    remember(user_id, profile)
+    return profile
+
+
+def invalidate(user_id):
+    _cache.pop(user_id, None)
+
+
+def cache_stats():
+    return {"hits": hits, "misses": misses, "size": len(_cache)}
@@ -0,0 +1,132 @@
+"""
+Optional group-commit buffer for single-row inserts (quick add, wizard save, /addsub).
+
+With WRITE_BUFFER=1 a single writer task collects rows submitted by all handlers
+for up to WRITE_BUFFER_MAX_DELAY_MS milliseconds (or WRITE_BUFFER_MAX_ROWS rows)
+and writes them as one multi-row insert in one transaction, i.e. one commit/fsync
+for the whole burst. `insert_row` only returns once the row has been committed,
+so handlers still reply after the data is durable.
+
+Without the buffer (the default) `insert_row` simply inserts and commits directly.
+"""
+import os
+import asyncio
+import logging
+from data.database import AsyncSessionLocal, Expense
+from data.bulk import insert_expenses
+
+logger = logging.getLogger(__name__)
+
+WRITE_BUFFER_ENABLED = os.getenv("WRITE_BUFFER", "0") == "1"
+WRITE_BUFFER_MAX_ROWS = int(os.getenv("WRITE_BUFFER_MAX_ROWS", 100))
+WRITE_BUFFER_MAX_DELAY_MS = int(os.getenv("WRITE_BUFFER_MAX_DELAY_MS", 5))
+
+_STOP = object()
+
+
+async def _write(session, model, rows):
+    if model is Expense:
+        # Also keeps the rollups in the same transaction
+        await insert_expenses(session, rows)
+    else:
+        await session.execute(model.__table__.insert(), rows)
+
+
+async def _write_and_commit(model, rows):
+    async with AsyncSessionLocal() as session:
+        await _write(session, model, rows)
+        await session.commit()
+
+
+class WriteBuffer:
+    def __init__(self, max_rows=WRITE_BUFFER_MAX_ROWS, max_delay_ms=WRITE_BUFFER_MAX_DELAY_MS):
+        self.max_rows = max_rows
+        self.max_delay = max_delay_ms / 1000
+        self._queue = asyncio.Queue()
+        self._task = None
+
+    @property
+    def running(self):
+        return self._task is not None and not self._task.done()
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Writes whatever is still queued, then stops the writer task."""
+        if self.running:
+            await self._queue.put(_STOP)
+            await self._task
+
+    async def submit(self, model, row):
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((model, row, future))
+        await future
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        stopping = False
+
+        while not stopping:
+            item = await self._queue.get()
+            if item is _STOP:
+                break
+
+            batch = [item]
+            deadline = loop.time() + self.max_delay
+            while len(batch) < self.max_rows:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self._queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                if item is _STOP:
+                    stopping = True
+                    break
+                batch.append(item)
+
+            await self._flush(batch)
+
+    async def _flush(self, batch):
+        by_model = {}
+        for model, row, future in batch:
+            by_model.setdefault(model, []).append((row, future))
+
+        try:
+            async with AsyncSessionLocal() as session:
+                for model, items in by_model.items():
+                    await _write(session, model, [row for row, _ in items])
+                await session.commit()
+        except Exception:
+            logger.exception("Group commit of %d rows failed, retrying rows one by one", len(batch))
+            # One bad row must not fail everybody else's insert
+            for model, row, future in batch:
+                try:
+                    await _write_and_commit(model, [row])
+                except Exception as e:
+                    if not future.done():
+                        future.set_exception(e)
+                else:
+                    if not future.done():
+                        future.set_result(None)
+            return
+
+        for _, _, future in batch:
+            if not future.done():
+                future.set_result(None)
+
+
+write_buffer = WriteBuffer()
+
+
+async def insert_row(model, row):
+    """
+    Inserts one row (a dict of column values) and returns once it is committed.
+    Goes through the group-commit buffer when it is running.
+    """
+    if write_buffer.running:
+        await write_buffer.submit(model, row)
+    else:
+        await _write_and_commit(model, [row])
@@ -3,6 +3,7 @@ from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
 from sqlalchemy import select
 from data.database import AsyncSessionLocal, User
+from data.user_cache import invalidate
 from utils.keyboards import get_main_menu
 
 router = Router()
@@ -12,11 +13,11 @@ class BudgetState(StatesGroup):
 
 @router.message(F.text == "🎯 Set Budget")
 async def start_set_budget(message: types.Message, state: FSMContext):
-    await message.answer(
+    await state.set_state(BudgetState.waiting_for_amount)
+    return message.answer(
         "Please enter your monthly budget target (e.g., 500 or 1000):", 
         reply_markup=types.ReplyKeyboardRemove() # Hide menu temporarily
     )
-    await state.set_state(BudgetState.waiting_for_amount)
 
 @router.message(BudgetState.waiting_for_amount)
 async def process_budget_amount(message: types.Message, state: FSMContext):
@@ -42,6 +43,7 @@ async def process_budget_amount(message: types.Message, state: FSMContext):
             session.add(user)
         
         await session.commit()
+    invalidate(user_id)
 
     await message.answer(
         f"✅ Monthly Budget updated to: <b>${limit:,.2f}</b>\n"
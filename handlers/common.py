@@ -10,7 +10,7 @@ async def cmd_start(message: types.Message):
     """
     Entry point for the bot.
     """
-    await message.answer(
+    return message.answer(
         f"Hello {message.from_user.first_name}! 👋\n"
         "I am your Personal Finance Bot.\n"
         "Use the buttons below to track your expenses.",
@@ -23,12 +23,12 @@ async def cmd_template(message: types.Message):
     Sends a sample CSV file for the user to fill out.
     """
     # Create a dummy CSV in memory
-    csv_content = "amount,category,description\n12.50,Food,Lunch at cafe\n50.00,Transport,Uber ride"
+    csv_content = "amount,category,description,date\n12.50,Food,Lunch at cafe,2024-05-01\n50.00,Transport,Uber ride,2024-05-02"
     
     file = BufferedInputFile(csv_content.encode(), filename="template.csv")
     
     await message.answer_document(
         document=file,
-        caption="📂 <b>Bulk Import Template</b>\n\n1. Download this file.\n2. Add your expenses.\n3. Send the file back here to import them!",
+        caption="📂 <b>Bulk Import Template</b>\n\n1. Download this file.\n2. Add your expenses (<code>description</code> and <code>date</code> are optional).\n3. Send the file back here to import them!",
         parse_mode="HTML"
     )
\ No newline at end of file
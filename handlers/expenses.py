@@ -1,10 +1,16 @@
-import re
+from html import escape
+from datetime import datetime
 from aiogram import Router, types, F
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
-from sqlalchemy import select, delete
+from sqlalchemy import delete
 from data.database import AsyncSessionLocal, Expense
+from data.bulk import insert_expenses
+from data.history import fetch_history_page
+from data.rollups import remove_from_rollups
+from data.write_buffer import insert_row
 from utils.keyboards import get_category_keyboard, get_main_menu, get_delete_keyboard # <--- Imported new function
+from utils.quick_add import parse_entries
 
 router = Router()
 
@@ -15,20 +21,20 @@ class AddExpenseState(StatesGroup):
 
 @router.message(F.text == "💸 Add Expense")
 async def start_add_expense(message: types.Message, state: FSMContext):
-    await message.answer("Enter the amount (e.g., 15.50):", reply_markup=types.ReplyKeyboardRemove())
     await state.set_state(AddExpenseState.waiting_for_amount)
+    return message.answer("Enter the amount (e.g., 15.50):", reply_markup=types.ReplyKeyboardRemove())
 
 @router.message(AddExpenseState.waiting_for_amount)
 async def process_amount(message: types.Message, state: FSMContext):
     try:
         amount = float(message.text)
-        await state.update_data(amount=amount)
-        await message.answer("Select a category:", reply_markup=get_category_keyboard())
-        await state.set_state(AddExpenseState.waiting_for_category)
     except ValueError:
-        await message.answer("Please enter a valid number.")
+        return message.answer("Please enter a valid number.")
+    await state.update_data(amount=amount)
+    await state.set_state(AddExpenseState.waiting_for_category)
+    return message.answer("Select a category:", reply_markup=get_category_keyboard())
 
-@router.message(AddExpenseState.waiting_for_category)
+@router.message(AddExpenseState.waiting_for_category, flags={"budget_alert": True})
 async def process_category(message: types.Message, state: FSMContext):
     if message.text == "✏️ Custom":
         await message.answer("Please type your custom category name:", reply_markup=types.ReplyKeyboardRemove())
@@ -37,124 +43,180 @@ async def process_category(message: types.Message, state: FSMContext):
     await save_expense(message, state, category_name=message.text)
 
 
-@router.message(AddExpenseState.waiting_for_custom_category)
+@router.message(AddExpenseState.waiting_for_custom_category, flags={"budget_alert": True})
 async def process_custom_category(message: types.Message, state: FSMContext):
     await save_expense(message, state, category_name=message.text)
 
+def expense_row(user_id, amount, category, description=None):
+    return {"user_id": user_id, "amount": amount, "category": category, "description": description, "timestamp": datetime.utcnow()}
+
 async def save_expense(message: types.Message, state: FSMContext, category_name: str):
     data = await state.get_data()
     amount = data['amount']
 
-    async with AsyncSessionLocal() as session:
-        new_expense = Expense(user_id=message.from_user.id, amount=amount, category=category_name)
-        session.add(new_expense)
-        await session.commit()
+    await insert_row(Expense, expense_row(message.from_user.id, amount, category_name))
 
     await message.answer(f"✅ Saved: ${amount} for {category_name}", reply_markup=get_main_menu())
     await state.clear()
 
-@router.message(F.text == "📜 History")
-async def show_history(message: types.Message):
-    async with AsyncSessionLocal() as session:
-        result = await session.execute(
-            select(Expense).where(Expense.user_id == message.from_user.id).order_by(Expense.timestamp.desc()).limit(10)
-        )
-        expenses = result.scalars().all()
-    
-    if not expenses:
-        await message.answer("No expenses found.")
-        return
-        
-    text = "🗓 <b>Recent Expenses:</b>\n"
-    for ex in expenses:
-        text += f"▫️ {ex.category}: ${ex.amount}\n"
-    await message.answer(text, parse_mode="HTML")
+class DeleteExpenseState(StatesGroup):
+    selecting = State()
 
+DELETE_PAGE_SIZE = 8
+MAX_DELETE_SELECTION = 100
 
-@router.message(F.text == "🗑 Delete")
-async def start_delete_process(message: types.Message):
-    async with AsyncSessionLocal() as session:
-        # Fetch last 5 expenses to keep the list manageable
-        result = await session.execute(
-            select(Expense).where(Expense.user_id == message.from_user.id).order_by(Expense.timestamp.desc()).limit(5)
-        )
-        expenses = result.scalars().all()
+def _page_key(row):
+    return [row.timestamp.isoformat(), row.id]
 
-    if not expenses:
-        await message.answer("No expenses to delete.")
-        return
+async def render_delete_page(user_id, data):
+    """Re-fetches the page the user is on and builds the selection keyboard."""
+    anchor = data.get("delete_anchor") # None (newest page) or ["o"|"n", timestamp, id]
+    older_than = newer_than = None
+    if anchor:
+        key = (datetime.fromisoformat(anchor[1]), anchor[2])
+        if anchor[0] == "o":
+            older_than = key
+        else:
+            newer_than = key
 
-    # Send the Inline Keyboard
-    await message.answer(
-        "Select an expense to delete:", 
-        reply_markup=get_delete_keyboard(expenses)
+    rows, has_older, has_newer = await fetch_history_page(
+        user_id, older_than=older_than, newer_than=newer_than, page_size=DELETE_PAGE_SIZE
     )
+    if not rows and anchor:
+        # Page emptied meanwhile, fall back to the newest one
+        rows, has_older, has_newer = await fetch_history_page(user_id, page_size=DELETE_PAGE_SIZE)
+        anchor = None
 
-@router.callback_query(F.data.startswith("del_"))
-async def process_delete_callback(callback: types.CallbackQuery):
-    action = callback.data.split("_")[1] # "del_15" -> "15" OR "del_cancel" -> "cancel"
+    page = {"anchor": anchor, "first": _page_key(rows[0]), "last": _page_key(rows[-1])} if rows else None
+    selected = data.get("delete_selected", [])
+    text = f"Select the expenses to delete, then confirm ({len(selected)} selected):"
+    return rows, page, text, get_delete_keyboard(rows, set(selected), has_older, has_newer)
+
+@router.message(F.text == "🗑 Delete")
+async def start_delete_process(message: types.Message, state: FSMContext):
+    data = {"delete_selected": [], "delete_anchor": None}
+    rows, page, text, markup = await render_delete_page(message.from_user.id, data)
+
+    if not rows:
+        return message.answer("No expenses to delete.")
+
+    await state.set_state(DeleteExpenseState.selecting)
+    await state.set_data(data | {"delete_page": page})
+    return message.answer(text, reply_markup=markup)
+
+@router.callback_query(DeleteExpenseState.selecting, F.data.startswith("del_"))
+async def process_delete_callback(callback: types.CallbackQuery, state: FSMContext):
+    # "del_t_15" toggles expense 15; "del_older" / "del_newer" page; "del_confirm" / "del_cancel" finish
+    action = callback.data[len("del_"):]
+    data = await state.get_data()
+    selected = data.get("delete_selected", [])
 
-    # Handle Cancel
     if action == "cancel":
+        await state.clear()
         await callback.message.delete() # Remove the menu
-        await callback.answer("Cancelled") # Tiny popup
-        return
+        return callback.answer("Cancelled") # Tiny popup
+
+    if action == "confirm":
+        if not selected:
+            return callback.answer("Nothing selected yet.")
+        deleted = await delete_expenses(callback.from_user.id, selected)
+        await state.clear()
+        await callback.answer()
+
+        text = f"✅ Deleted {len(deleted)} expense(s), ${sum(row.amount for row in deleted):.2f} in total."
+        if len(deleted) < len(selected):
+            text += f"\n{len(selected) - len(deleted)} of the selected expenses no longer existed."
+        return callback.message.edit_text(text)
+
+    page = data.get("delete_page")
+    if action.startswith("t_"):
+        expense_id = int(action[2:])
+        if expense_id in selected:
+            selected.remove(expense_id)
+        elif len(selected) >= MAX_DELETE_SELECTION:
+            return callback.answer(f"You can delete up to {MAX_DELETE_SELECTION} expenses at once.")
+        else:
+            selected.append(expense_id)
+    elif action == "older" and page:
+        data["delete_anchor"] = ["o", *page["last"]]
+    elif action == "newer" and page:
+        data["delete_anchor"] = ["n", *page["first"]]
+
+    data["delete_selected"] = selected
+    rows, data["delete_page"], text, markup = await render_delete_page(callback.from_user.id, data)
+    if not rows:
+        await state.clear()
+        await callback.answer()
+        return callback.message.edit_text("No expenses to delete.")
+
+    data["delete_anchor"] = data["delete_page"]["anchor"]
+    await state.set_data(data)
+    await callback.answer()
+    return callback.message.edit_text(text, reply_markup=markup)
+
+@router.callback_query(F.data.startswith("del_"))
+async def expired_delete_callback(callback: types.CallbackQuery):
+    # Menu from an older session (or already confirmed)
+    return callback.answer("This menu has expired, press 🗑 Delete again.", show_alert=True)
 
-    # Handle Deletion
-    expense_id = int(action)
-    
+async def delete_expenses(user_id, expense_ids):
+    """
+    Deletes the given expenses of one user with a single statement and takes them out of
+    the rollups in the same transaction. Ids of other users are ignored.
+    Returns the deleted rows.
+    """
     async with AsyncSessionLocal() as session:
-        # Check if expense exists (and belongs to this user for security)
-        result = await session.execute(select(Expense).where(Expense.id == expense_id))
-        expense = result.scalar_one_or_none()
-        
-        if expense:
-            await session.delete(expense)
-            await session.commit()
-            await callback.message.edit_text(f"✅ Deleted expense: {expense.category} - ${expense.amount}")
-        else:
-            await callback.message.edit_text("❌ Expense not found (already deleted?).")
-    
-    await callback.answer() 
+        result = await session.execute(
+            delete(Expense)
+            .where(Expense.user_id == user_id, Expense.id.in_(expense_ids))
+            .returning(Expense.user_id, Expense.timestamp, Expense.category, Expense.amount)
+            .execution_options(synchronize_session=False)
+        )
+        deleted = result.all()
+        await remove_from_rollups(session, deleted)
+        await session.commit()
+    return deleted
 
 
-@router.message(F.text)
+MAX_SUMMARY_LINES = 20
+
+@router.message(F.text, flags={"budget_alert": True})
 async def smart_add_expense(message: types.Message, state: FSMContext):
     """
     Catches any text that hasn't been handled by buttons or commands.
-    Tries to parse: "15 Food" or "Taxi 20".
+    Parses one or many lines like "15 Food", "Taxi 20" or "Lunch - $12.50".
     """
-    text = message.text.strip()
-    #  Number then Text (e.g. "15.50 Lunch")
-    pattern1 = r"^(\d+(?:\.\d+)?)\s+(.+)$"
-    # Text then Number (e.g. "Lunch 15.50")
-    pattern2 = r"^(.+)\s+(\d+(?:\.\d+)?)$"
-
-    match1 = re.match(pattern1, text)
-    match2 = re.match(pattern2, text)
-
-    amount = 0.0
-    category = ""
-
-    if match1:
-        amount = float(match1.group(1))
-        category = match1.group(2).strip()
-    elif match2:
-        category = match2.group(1).strip()
-        amount = float(match2.group(2))
+    parsed, rejected = parse_entries(message.text)
+    if not parsed:
+        if len(rejected) > 1:
+            return message.answer("⚠️ Could not read any expense. Send lines like <code>15 Food</code> or <code>Taxi 20</code>.", parse_mode="HTML")
+        return # Plain chat, not an expense
+
+    rows = [expense_row(message.from_user.id, amount, category) for amount, category in parsed]
+    if len(rows) == 1:
+        await insert_row(Expense, rows[0])
     else:
-        return 
-
-    # Capitalize category for consistency (e.g. "food" -> "Food")
-    category = category.title()
+        # All lines in one statement and one commit
+        async with AsyncSessionLocal() as session:
+            await insert_expenses(session, rows)
+            await session.commit()
 
-    async with AsyncSessionLocal() as session:
-        new_expense = Expense(user_id=message.from_user.id, amount=amount, category=category)
-        session.add(new_expense)
-        await session.commit()
+    if len(parsed) == 1 and not rejected:
+        amount, category = parsed[0]
+        return message.answer(
+            f"⚡ <b>Quick Save:</b> ${amount:.2f} for <b>{escape(category)}</b>\n",
+            parse_mode="HTML",
+            reply_markup=get_main_menu()
+        )
 
-    await message.answer(
-        f"⚡ <b>Quick Save:</b> ${amount} for <b>{category}</b>\n",
-        parse_mode="HTML",
-        reply_markup=get_main_menu()
-    )
\ No newline at end of file
+    total = sum(amount for amount, _ in parsed)
+    text = f"⚡ <b>Quick Save:</b> {len(parsed)} expense(s), ${total:.2f} in total\n"
+    text += "".join(f"▫️ {escape(category)}: ${amount:.2f}\n" for amount, category in parsed[:MAX_SUMMARY_LINES])
+    if len(parsed) > MAX_SUMMARY_LINES:
+        text += f"▫️ ... and {len(parsed) - MAX_SUMMARY_LINES} more\n"
+    if rejected:
+        text += f"\n⚠️ Skipped {len(rejected)} line(s):\n"
+        text += "".join(f"• <code>{escape(line[:50])}</code>\n" for line in rejected[:MAX_SUMMARY_LINES])
+        if len(rejected) > MAX_SUMMARY_LINES:
+            text += f"• ... and {len(rejected) - MAX_SUMMARY_LINES} more\n"
+    return message.answer(text, parse_mode="HTML", reply_markup=get_main_menu())
@@ -1,85 +1,46 @@
-import io
-import pandas as pd
 from aiogram import Router, types, F
-from sqlalchemy import select
-from data.database import AsyncSessionLocal, Expense
 from utils.keyboards import get_export_keyboard
-from utils.pdf_generator import generate_receipt_pdf
+from utils.export_worker import notify_workers
+from data.export_jobs import enqueue_job
+from handlers.statistics import get_date_range
 
 router = Router()
 
 @router.message(F.text == "📥 Export")
 async def show_export_options(message: types.Message):
-    await message.answer(
+    return message.answer(
         "📂 <b>Export Data</b>\n\n"
         "Click the button below to download your expenses as a formal receipt.",
         reply_markup=get_export_keyboard(),
         parse_mode="HTML"
     )
 
-@router.callback_query(F.data == "download_pdf")
-async def send_pdf_receipt(callback: types.CallbackQuery):
-    await callback.answer("Generating receipt...") # Gives visual feedback immediately
-
-    # Fetch all expenses for the user
-    async with AsyncSessionLocal() as session:
-        result = await session.execute(
-            select(Expense).where(Expense.user_id == callback.from_user.id).order_by(Expense.timestamp.desc())
-        )
-        expenses = result.scalars().all()
-
-    if not expenses:
-        await callback.message.answer("⚠️ You have no expenses to generate a receipt.")
-        return
-
-    # Generate the PDF
-    pdf_file = generate_receipt_pdf(callback.from_user.first_name, expenses)
-
-    # BufferedInputFile allows sending 'in-memory' files without saving to disk
-    input_file = types.BufferedInputFile(
-        pdf_file.read(), 
-        filename=f"receipt_{callback.from_user.id}.pdf"
+async def queue_export(callback, kind, period=None):
+    start_date = end_date = None
+    if period:
+        start_date, end_date, _ = get_date_range(period)
+
+    queued = await enqueue_job(
+        callback.from_user.id, callback.message.chat.id, kind,
+        dedup_key=f"{kind}:{period or 'all'}",
+        params={
+            "first_name": callback.from_user.first_name,
+            "start": start_date.isoformat() if start_date else None,
+            "end": end_date.isoformat() if end_date else None,
+        }
     )
+    if not queued:
+        return callback.answer("⏳ This export is already being prepared, it will arrive shortly.")
 
-    await callback.message.answer_document(
-        document=input_file,
-        caption="🧾 Here is your expense receipt."
-    )
+    notify_workers()
+    return callback.answer("⏳ Preparing your file, I'll send it here as soon as it's ready.")
+
+@router.callback_query(F.data.startswith("download_pdf"))
+async def send_pdf_receipt(callback: types.CallbackQuery):
+    # "download_pdf" -> all time, "download_pdf_current" / "download_pdf_previous" -> one month
+    parts = callback.data.split("_")
+    return await queue_export(callback, "pdf", parts[2] if len(parts) == 3 else None)
 
 @router.callback_query(F.data == "download_excel")
 async def send_excel_report(callback: types.CallbackQuery):
-    await callback.answer("Generating Excel...")
-
-    async with AsyncSessionLocal() as session:
-        result = await session.execute(
-            select(Expense).where(Expense.user_id == callback.from_user.id).order_by(Expense.timestamp.desc())
-        )
-        expenses = result.scalars().all()
-
-    if not expenses:
-        await callback.message.answer("⚠️ No data found.")
-        return
-
-    data = [
-        {
-            "Date": ex.timestamp.strftime("%Y-%m-%d %H:%M"),
-            "Category": ex.category,
-            "Amount": ex.amount,
-            "ID": ex.id
-        }
-        for ex in expenses
-    ]
-    df = pd.DataFrame(data)
-
-    output = io.BytesIO()
-    # using 'openpyxl' engine to write .xlsx
-    with pd.ExcelWriter(output, engine='openpyxl') as writer:
-        df.to_excel(writer, index=False, sheet_name="Expenses")
-    
-    output.seek(0)
-
-    input_file = types.BufferedInputFile(output.read(), filename="expenses_report.xlsx")
-    await callback.message.answer_document(
-        document=input_file, 
-        caption="📊 Here is your Excel report. You can open this in Google Sheets or Excel."
-    )
\ No newline at end of file
+    return await queue_export(callback, "excel")
@@ -0,0 +1,139 @@
+import re
+import zlib
+from html import escape
+from datetime import datetime, timedelta
+from aiogram import Router, types, F
+from aiogram.filters import Command, CommandObject
+from sqlalchemy import select
+from data.database import AsyncSessionLocal, ExpenseRollup
+from data.history import fetch_history_page
+from utils.keyboards import get_history_keyboard
+
+router = Router()
+
+MONTH_RE = re.compile(r"^\d{4}-(0[1-9]|1[0-2])$")
+EPOCH = datetime(1970, 1, 1)
+CALLBACK_DATA_LIMIT = 64 # bytes, Telegram limit
+# resolve_category result for a hash that no longer matches any of the user's categories
+UNKNOWN_CATEGORY = object()
+
+
+def _b36(n):
+    digits = "0123456789abcdefghijklmnopqrstuvwxyz"
+    out = ""
+    while True:
+        n, r = divmod(n, 36)
+        out = digits[r] + out
+        if not n:
+            return out
+
+
+def _category_hash(category):
+    return "#" + _b36(zlib.crc32(category.lower().encode()))
+
+
+def pack_page(direction, row, month, category):
+    """
+    Callback data of a page button: "hist_<o|n>_<timestamp>_<id>_<month>_<category>".
+    The key (timestamp in microseconds, id) is base36; a category too long for the
+    64-byte limit is replaced by a hash and looked up again on the next page.
+    Categories starting with "#" are always hashed, so they cannot be mistaken for a hash.
+    """
+    micros = (row.timestamp - EPOCH) // timedelta(microseconds=1)
+    data = f"hist_{direction}_{_b36(micros)}_{_b36(row.id)}_{month or ''}_"
+    if category and (category.startswith("#") or len((data + category).encode()) > CALLBACK_DATA_LIMIT):
+        category = _category_hash(category)
+    return data + (category or "")
+
+
+def unpack_page(data):
+    _, direction, micros, expense_id, month, category = data.split("_", 5)
+    key = (EPOCH + timedelta(microseconds=int(micros, 36)), int(expense_id, 36))
+    return direction, key, month or None, category or None
+
+
+async def resolve_category(user_id, category):
+    """
+    Turns a hashed category back into its name using the user's rollup categories.
+    Returns UNKNOWN_CATEGORY if none matches anymore (e.g. its last expense was deleted).
+    """
+    if not category or not category.startswith("#"):
+        return category
+    async with AsyncSessionLocal() as session:
+        result = await session.execute(
+            select(ExpenseRollup.category).where(ExpenseRollup.user_id == user_id).distinct()
+        )
+        for name in result.scalars():
+            if _category_hash(name) == category:
+                return name
+    return UNKNOWN_CATEGORY
+
+
+def parse_filters(args):
+    """"/history 2024-03 Food" -> ("2024-03", "Food"); both parts optional, in any order."""
+    month = None
+    words = []
+    for word in (args or "").split():
+        if month is None and MONTH_RE.match(word):
+            month = word
+        else:
+            words.append(word)
+    return month, " ".join(words) or None
+
+
+def render_page(rows, has_older, has_newer, month, category, first_page):
+    title = "Recent Expenses" if first_page else "Expenses"
+    filters = ", ".join(escape(f) for f in (category, month) if f)
+    text = f"🗓 <b>{title}</b>" + (f" ({filters})" if filters else "") + ":\n"
+    for row in rows:
+        text += f"▫️ {row.timestamp:%Y-%m-%d} {escape(row.category)}: ${row.amount:.2f}\n"
+
+    older = pack_page("o", rows[-1], month, category) if has_older else None
+    newer = pack_page("n", rows[0], month, category) if has_newer else None
+    return text, get_history_keyboard(older, newer)
+
+
+@router.message(F.text == "📜 History")
+@router.message(Command("history"))
+async def show_history(message: types.Message, command: CommandObject = None):
+    """
+    Usage: /history [YYYY-MM] [category]
+    """
+    month, category = parse_filters(command.args if command else None)
+
+    rows, has_older, has_newer = await fetch_history_page(message.from_user.id, category=category, month=month)
+    if not rows:
+        if month or category:
+            return message.answer("No expenses found for these filters.")
+        return message.answer("No expenses found.")
+
+    text, markup = render_page(rows, has_older, has_newer, month, category, first_page=True)
+    return message.answer(text, parse_mode="HTML", reply_markup=markup)
+
+
+@router.callback_query(F.data.startswith("hist_"))
+async def page_history(callback: types.CallbackQuery):
+    direction, key, month, category = unpack_page(callback.data)
+    category = await resolve_category(callback.from_user.id, category)
+    if category is UNKNOWN_CATEGORY:
+        # Paging on without the filter would silently show every category
+        return callback.answer("No expenses found for these filters.")
+
+    if direction == "o":
+        rows, has_older, has_newer = await fetch_history_page(
+            callback.from_user.id, older_than=key, category=category, month=month
+        )
+    else:
+        rows, has_older, has_newer = await fetch_history_page(
+            callback.from_user.id, newer_than=key, category=category, month=month
+        )
+
+    if not rows:
+        # e.g. the expenses on that side were deleted meanwhile
+        return callback.answer("No more expenses.")
+
+    await callback.answer()
+    # Back on the newest page: same view as the one /history opened with
+    first_page = direction == "n" and not has_newer
+    text, markup = render_page(rows, has_older, has_newer, month, category, first_page)
+    return callback.message.edit_text(text, parse_mode="HTML", reply_markup=markup)
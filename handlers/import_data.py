@@ -1,11 +1,84 @@
-import pandas as pd
-import io
+import os
+import time
+import asyncio
+import tempfile
+from datetime import datetime
 from aiogram import Router, types, F, Bot
-from data.database import AsyncSessionLocal, Expense
+from data.database import AsyncSessionLocal
+from data.bulk import insert_expenses
+from utils.metrics import IMPORT_ROWS
+from utils.quick_add import parse_amount
 
 router = Router()
 
-@router.message(F.document)
+# Rows parsed, validated and inserted per batch (env: IMPORT_CHUNK_SIZE)
+IMPORT_CHUNK_SIZE = int(os.getenv("IMPORT_CHUNK_SIZE", 1000))
+PROGRESS_EVERY_SECONDS = 2
+MAX_SUMMARY_LINES = 10
+
+
+def clean_chunk(chunk, user_id, imported_at):
+    """
+    Vectorized validation of one CSV chunk.
+    Returns (rows ready for insert, {reason: rejected count}).
+    """
+    import numpy as np
+    import pandas as pd
+
+    chunk.columns = [str(c).strip().lower() for c in chunk.columns]
+
+    # Plain numbers as float() reads them ("12.5", "-3", "1e3"); the rest must be one
+    # amount by the quick-add rules ("$1,234.50", "€ 9,99", "12,50"), else it is rejected
+    raw = chunk['amount'].astype(str).str.strip()
+    amounts = pd.to_numeric(raw, errors='coerce')
+    formatted = raw[amounts.isna() & chunk['amount'].notna()].map(parse_amount).astype(float)
+    amounts = amounts.fillna(formatted)
+    amounts = amounts.where(np.isfinite(amounts))
+    categories = chunk['category'].astype(str).str.strip().str.title()
+    bad_category = chunk['category'].isna() | (categories == "")
+
+    if 'description' in chunk.columns:
+        descriptions = chunk['description'].astype(object).where(chunk['description'].notna(), None)
+        descriptions = descriptions.map(lambda d: None if d is None else str(d))
+    else:
+        descriptions = pd.Series([None] * len(chunk), index=chunk.index, dtype=object)
+
+    # Optional date column; empty cells fall back to the import time
+    date_col = next((c for c in ('date', 'timestamp') if c in chunk.columns), None)
+    bad_date = pd.Series(False, index=chunk.index)
+    if date_col:
+        raw_dates = chunk[date_col]
+        parsed = pd.to_datetime(raw_dates, errors='coerce', utc=True, format='mixed').dt.tz_localize(None)
+        bad_date = parsed.isna() & raw_dates.notna()
+        timestamps = parsed.astype(object).where(parsed.notna(), imported_at)
+        timestamps = timestamps.map(lambda t: t.to_pydatetime() if isinstance(t, pd.Timestamp) else t)
+    else:
+        timestamps = pd.Series([imported_at] * len(chunk), index=chunk.index, dtype=object)
+
+    bad_amount = amounts.isna()
+    valid = ~(bad_amount | bad_category | bad_date)
+
+    rejected = {}
+    for reason, mask in (("bad amount", bad_amount), ("missing category", bad_category & ~bad_amount),
+                         ("bad date", bad_date & ~bad_amount & ~bad_category)):
+        if mask.any():
+            rejected[reason] = int(mask.sum())
+
+    rows = [
+        {"user_id": user_id, "amount": amount, "category": category, "description": desc, "timestamp": ts}
+        for amount, category, desc, ts in zip(
+            amounts[valid].tolist(), categories[valid].tolist(),
+            descriptions[valid].tolist(), timestamps[valid].tolist()
+        )
+    ]
+    return rows, rejected
+
+
+def _read_next_chunk(reader):
+    return next(reader, None)
+
+
+@router.message(F.document, flags={"heavy": "import", "budget_alert": True})
 async def handle_document_upload(message: types.Message, bot: Bot):
     document = message.document
     file_name = document.file_name.lower() if document.file_name else ""
@@ -17,53 +90,82 @@ async def handle_document_upload(message: types.Message, bot: Bot):
             "Please upload a CSV file or use /template to see the format.",
             parse_mode="HTML"
         )
-        return 
+        return
 
-    await message.reply("⏳ Processing CSV file...")
+    status = await message.reply("⏳ Processing CSV file...")
+
+    fd, path = tempfile.mkstemp(suffix=".csv")
+    os.close(fd)
+    imported = 0
+    skipped = 0
+    summary = []
 
     try:
-        file_obj = io.BytesIO()
+        # Stream the upload to disk instead of holding it in memory
         file = await bot.get_file(document.file_id)
-        await bot.download_file(file.file_path, file_obj)
-        file_obj.seek(0)
+        await bot.download_file(file.file_path, path)
+
+        # pandas is heavy, it is only loaded once somebody imports a file
+        import pandas as pd
+        reader = await asyncio.to_thread(
+            pd.read_csv, path, chunksize=IMPORT_CHUNK_SIZE, dtype=str, skipinitialspace=True
+        )
+        imported_at = datetime.utcnow()
+        last_progress = time.monotonic()
+        chunk_no = 0
 
-        df = pd.read_csv(file_obj)
+        while True:
+            # Parsing and validation are CPU work, keep them off the event loop
+            chunk = await asyncio.to_thread(_read_next_chunk, reader)
+            if chunk is None:
+                break
+            chunk_no += 1
+            first_row = (chunk_no - 1) * IMPORT_CHUNK_SIZE + 1
+            last_row = first_row + len(chunk) - 1
 
-        df.columns = [c.lower() for c in df.columns]
+            if chunk_no == 1:
+                columns = {str(c).strip().lower() for c in chunk.columns}
+                if not {'amount', 'category'}.issubset(columns):
+                    await status.edit_text("❌ <b>Format Error:</b> CSV must have columns: <code>amount</code>, <code>category</code>", parse_mode="HTML")
+                    return
 
-        required_cols = {'amount', 'category'}
-        if not required_cols.issubset(df.columns):
-            await message.reply("❌ <b>Format Error:</b> CSV must have columns: <code>amount</code>, <code>category</code>", parse_mode="HTML")
-            return
+            rows, rejected = await asyncio.to_thread(clean_chunk, chunk, message.from_user.id, imported_at)
 
-        expenses_to_add = []
-        count = 0
-        
-        for _, row in df.iterrows():
             try:
-                amt = float(row['amount'])
-                cat = str(row['category']).title()
-                desc = str(row['description']) if 'description' in row else None
-                
-                exp = Expense(
-                    user_id=message.from_user.id,
-                    amount=amt,
-                    category=cat,
-                    description=desc
-                )
-                expenses_to_add.append(exp)
-                count += 1
-            except (ValueError, TypeError):
-                continue # Skip bad rows
-
-        if expenses_to_add:
-            async with AsyncSessionLocal() as session:
-                session.add_all(expenses_to_add)
-                await session.commit()
-            
-            await message.reply(f"✅ Success! Imported <b>{count}</b> expenses.", parse_mode="HTML")
-        else:
-            await message.reply("⚠️ No valid data found in CSV.")
+                async with AsyncSessionLocal() as session:
+                    await insert_expenses(session, rows)
+                    await session.commit()
+            except Exception as e:
+                skipped += len(chunk)
+                IMPORT_ROWS.labels("failed").inc(len(chunk))
+                summary.append(f"Rows {first_row}-{last_row}: not saved ({e.__class__.__name__})")
+                continue
+
+            imported += len(rows)
+            IMPORT_ROWS.labels("imported").inc(len(rows))
+            if rejected:
+                skipped += sum(rejected.values())
+                IMPORT_ROWS.labels("rejected").inc(sum(rejected.values()))
+                reasons = ", ".join(f"{n} {reason}" for reason, n in rejected.items())
+                summary.append(f"Rows {first_row}-{last_row}: skipped {reasons}")
+
+            if time.monotonic() - last_progress >= PROGRESS_EVERY_SECONDS:
+                last_progress = time.monotonic()
+                await status.edit_text(f"⏳ Processing CSV file... {imported} imported, {skipped} skipped so far")
 
     except Exception as e:
-        await message.reply(f"❌ Import Failed: {str(e)}")
\ No newline at end of file
+        await message.reply(f"❌ Import Failed: {str(e)}\nImported before the error: {imported}")
+        return
+    finally:
+        os.remove(path)
+
+    if not imported:
+        await status.edit_text("⚠️ No valid data found in CSV.")
+        return
+
+    text = f"✅ Success! Imported <b>{imported}</b> expenses."
+    if skipped:
+        text += f"\n⚠️ Skipped <b>{skipped}</b> rows:\n" + "\n".join(f"• {line}" for line in summary[:MAX_SUMMARY_LINES])
+        if len(summary) > MAX_SUMMARY_LINES:
+            text += f"\n• ... and {len(summary) - MAX_SUMMARY_LINES} more chunks"
+    await status.edit_text(text, parse_mode="HTML")
@@ -1,64 +1,61 @@
 from aiogram import Router, types, F
 import calendar
 from datetime import datetime
-from sqlalchemy import select
-from data.database import AsyncSessionLocal, Expense, User, Subscription 
+from html import escape
+from data.database import AsyncSessionLocal
+from data.analytics import analytics_window, forecast_data
+from data.rollups import year_month
+from utils.forecast import analyze, WEEKDAYS
 
 router = Router()
 
+MAX_TRENDS = 3
+MAX_ANOMALIES = 3
+
 @router.message(F.text == "🔮 Forecast")
 async def generate_forecast(message: types.Message):
     user_id = message.from_user.id
     now = datetime.utcnow()
     
-    start_date = datetime(now.year, now.month, 1)
     _, last_day = calendar.monthrange(now.year, now.month)
     
     async with AsyncSessionLocal() as session:
-        query = select(Expense).where(
-            Expense.user_id == user_id,
-            Expense.timestamp >= start_date
-        )
-        result = await session.execute(query)
-        expenses = result.scalars().all()
-
-        user_result = await session.execute(select(User).where(User.user_id == user_id))
-        user_settings = user_result.scalar_one_or_none()
+        # Day x category buckets of the last 12 months in one grouped query, which also
+        # loads budget + subscriptions when they are not cached.
+        # Charged subscriptions are counted as fixed costs below, not as variable spending
+        first_day, end = analytics_window(now)
+        rows, profile = await forecast_data(session, user_id, first_day, end, exclude_subscription_charges=True)
 
-        sub_result = await session.execute(select(Subscription).where(Subscription.user_id == user_id))
-        subs = sub_result.scalars().all()
-
-    if not expenses and not subs and not user_settings:
-        await message.answer("⚠️ Not enough data yet. Set a /budget or add expenses/subscriptions first!")
-        return
+    analysis = analyze(rows, now)
+    if analysis is None and not profile.subscriptions and profile.budget_limit is None:
+        return message.answer("⚠️ Not enough data yet. Set a /budget or add expenses/subscriptions first!")
 
     # Calculations
-    total_variable_spent = sum(ex.amount for ex in expenses)
-    fixed_costs = sum(s.amount for s in subs)
+    total_variable_spent = analysis.spent_this_month if analysis else 0.0
+    # Subscriptions added this month after their billing day start next month
+    fixed_costs = profile.fixed_costs_in(year_month(now))
     total_spent_so_far = total_variable_spent + fixed_costs
     
-    budget = user_settings.budget_limit if user_settings else 0.0
+    budget = profile.budget_limit or 0.0
     
     disposable_budget = budget - fixed_costs
 
     days_passed = now.day
     days_in_month = last_day
     days_remaining = days_in_month - days_passed
-    if days_passed == 0: days_passed = 1
 
-    daily_average = total_variable_spent / days_passed
-    projected_variable = daily_average * days_in_month
+    # 30 day average weighted by weekday, see utils/forecast.py; with less than a week of
+    # history there is nothing to project from, the estimate is what was spent so far
+    projected = analysis.projected_month if analysis else None
+    projected_variable = projected if projected is not None else total_variable_spent
     
     total_projected = projected_variable + fixed_costs
     
     top_category = "None"
     top_cat_amount = 0.0
-    if expenses:
-        category_totals = {}
-        for ex in expenses:
-            category_totals[ex.category] = category_totals.get(ex.category, 0) + ex.amount
-        top_category = max(category_totals, key=category_totals.get)
-        top_cat_amount = category_totals[top_category]
+    if analysis and analysis.month_by_category:
+        # Biggest category first
+        top_category, top_cat_amount = analysis.month_by_category[0]
 
     progress_bar = ""
     percent = 0
@@ -81,8 +78,12 @@ async def generate_forecast(message: types.Message):
         
         f"<b>📊 Current Status</b>\n"
         f"💸 Var. Spent: <code>${total_variable_spent:,.2f}</code>\n"
-        f"📅 Daily Avg: <code>${daily_average:,.2f}</code>\n"
     )
+    if analysis and analysis.projected_month is not None:
+        text += (
+            f"📅 Daily Avg: <code>${analysis.avg_7d:,.2f}</code> (7d) · "
+            f"<code>${analysis.avg_30d:,.2f}</code> (30d)\n"
+        )
 
     if budget > 0:
         text += f"🎯 Budget: <code>${budget:,.2f}</code>\n"
@@ -92,8 +93,10 @@ async def generate_forecast(message: types.Message):
     text += (
         f"<b>🚀 Month-End Projection</b>\n"
         f"🔮 Estimate: <code>${total_projected:,.2f}</code>\n"
-        f"──────────────────\n"
     )
+    if analysis and projected is None:
+        text += "<i>Spent so far; the projection needs a week of history.</i>\n"
+    text += "──────────────────\n"
 
     # ADVISOR LOGIC
     if budget > 0:
@@ -128,6 +131,28 @@ async def generate_forecast(message: types.Message):
         text += "<i>💡 Tip: Use '🎯 Set Budget' to unlock smart financial advice.</i>"
 
     if top_cat_amount > 0:
-        text += f"\n\n🔻 <b>Top Drain:</b> {top_category} (<code>${top_cat_amount:,.2f}</code>)"
+        text += f"\n\n🔻 <b>Top Drain:</b> {escape(top_category)} (<code>${top_cat_amount:,.2f}</code>)"
+
+    if analysis:
+        text += _insights_text(analysis)
+
+    return message.answer(text, parse_mode="HTML")
+
+def _insights_text(analysis):
+    text = ""
+    factors = analysis.weekday_factors
+    busiest = max(range(7), key=lambda d: factors[d])
+    if factors[busiest] >= 1.2:
+        text += f"\n📆 <b>Busiest Day:</b> {WEEKDAYS[busiest]} ({factors[busiest]:.1f}× an average day)"
+
+    if analysis.trends:
+        text += "\n\n<b>📈 Trends</b> (per month)\n"
+        for category, slope, _mean in analysis.trends[:MAX_TRENDS]:
+            arrow = "↗" if slope > 0 else "↘"
+            text += f"{arrow} {escape(category)}: <code>{'+' if slope > 0 else '-'}${abs(slope):,.2f}</code>\n"
 
-    await message.answer(text, parse_mode="HTML")
\ No newline at end of file
+    if analysis.anomalies:
+        text += "\n<b>🔍 Unusual Spending</b>\n"
+        for day, category, amount, usual in analysis.anomalies[:MAX_ANOMALIES]:
+            text += f"• {day:%b %d} {escape(category)}: <code>${amount:,.2f}</code> (usually ${usual:,.2f})\n"
+    return text
@@ -1,16 +1,19 @@
-import matplotlib.pyplot as plt
-import io
 from datetime import datetime, timedelta
 from aiogram import Router, types, F
-from sqlalchemy import select
-from data.database import AsyncSessionLocal, Expense, User
+from aiogram.exceptions import TelegramBadRequest
+from data.database import AsyncSessionLocal
+from data.user_cache import get_user_profile
+from data.rollups import category_totals, year_month
 from utils.keyboards import get_stats_period_keyboard
+from utils.charts import render_chart
+from utils.chart_cache import chart_digest, get_file_id, remember, forget
+from utils.metrics import RENDER_SECONDS
 
 router = Router()
 
 @router.message(F.text == "📊 Stats")
 async def ask_time_period(message: types.Message):
-    await message.answer(
+    return message.answer(
         "Select the time period for your report:",
         reply_markup=get_stats_period_keyboard()
     )
@@ -36,7 +39,7 @@ def get_date_range(period):
         
     return start_date, end_date, title
 
-@router.callback_query(F.data.startswith("stats_"))
+@router.callback_query(F.data.startswith("stats_"), flags={"heavy": "stats"})
 async def generate_stats(callback: types.CallbackQuery):
     period = callback.data.split("_")[1]
     start_date, end_date, title = get_date_range(period)
@@ -44,33 +47,27 @@ async def generate_stats(callback: types.CallbackQuery):
     await callback.message.edit_text(f"Generating chart for: {title}...")
 
     async with AsyncSessionLocal() as session:
-        query = select(Expense).where(
-            Expense.user_id == callback.from_user.id,
-            Expense.timestamp >= start_date,
-            Expense.timestamp <= end_date
+        # Periods are whole months, so the monthly rollups answer this without touching raw expenses
+        totals = await category_totals(
+            session, callback.from_user.id, year_month(start_date), year_month(end_date)
         )
-        result = await session.execute(query)
-        expenses = result.scalars().all()
 
-        # Fetch User Budget
-        user_result = await session.execute(select(User).where(User.user_id == callback.from_user.id))
-        user_settings = user_result.scalar_one_or_none()
+        # Fetch User Budget (cached)
+        profile = await get_user_profile(callback.from_user.id, session)
 
-    if not expenses:
+    if not totals:
         await callback.message.edit_text(f"⚠️ No expenses found for {title}.")
         return
 
-    # Aggregate Data
-    data = {}
-    total_spent = 0
-    for ex in expenses:
-        data[ex.category] = data.get(ex.category, 0) + ex.amount
-        total_spent += ex.amount
+    data = {category: total for category, total, _ in totals}
+    total_spent = sum(data.values())
+    expense_count = sum(count for _, _, count in totals)
 
     # --- Budget Progress Logic ---
     budget_text = ""
-    if period == "current" and user_settings and user_settings.budget_limit > 0:
-        limit = user_settings.budget_limit
+    budget_limit = profile.budget_limit or 0.0
+    if period == "current" and budget_limit > 0:
+        limit = budget_limit
         percent = (total_spent / limit) * 100
         
         # Create Bar: [▓▓▓▓▓░░░░░]
@@ -88,21 +85,29 @@ async def generate_stats(callback: types.CallbackQuery):
 
     labels = [f"{k} (${v:.0f})" for k, v in data.items()]
     values = list(data.values())
+    caption = f"📊 <b>{title}</b>\nTotal Spent: <b>${total_spent:.2f}</b> ({expense_count} expenses){budget_text}"
 
-    plt.figure(figsize=(6, 6))
-    plt.pie(values, labels=labels, autopct='%1.1f%%', startangle=140)
-    plt.title(f"{title}\nTotal: ${total_spent:.2f}")
+    await callback.message.delete()
+
+    # Same period, totals and budget as a chart we already sent -> reuse its file_id
+    digest = chart_digest(title, data, budget_limit)
+    file_id = get_file_id(digest)
+    if file_id:
+        try:
+            await callback.message.answer_photo(file_id, caption=caption, parse_mode="HTML")
+            return
+        except TelegramBadRequest:
+            forget(digest) # file_id no longer valid, render a fresh one
 
-    buf = io.BytesIO()
-    plt.savefig(buf, format='png')
-    buf.seek(0)
-    plt.close()
+    # Rendered in the chart worker pool so the event loop keeps serving other users
+    with RENDER_SECONDS.labels("chart").time():
+        png = await render_chart(labels, values, f"{title}\nTotal: ${total_spent:.2f}")
 
-    photo_file = types.BufferedInputFile(buf.read(), filename="chart.png")
+    photo_file = types.BufferedInputFile(png, filename="chart.png")
     
-    await callback.message.delete()
-    await callback.message.answer_photo(
+    sent = await callback.message.answer_photo(
         photo_file, 
-        caption=f"📊 <b>{title}</b>\nTotal Spent: <b>${total_spent:.2f}</b>{budget_text}", 
+        caption=caption, 
         parse_mode="HTML"
-    )
\ No newline at end of file
+    )
+    remember(callback.from_user.id, period, digest, sent.photo[-1].file_id)
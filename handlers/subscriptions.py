@@ -1,6 +1,9 @@
 from aiogram import Router, types, F
-from sqlalchemy import select, delete
-from data.database import AsyncSessionLocal, Subscription
+from sqlalchemy import delete
+from data.database import AsyncSessionLocal, Subscription, SubscriptionCharge
+from data.subscription_charges import first_billing_month
+from data.write_buffer import insert_row
+from data.user_cache import get_user_profile, invalidate
 from aiogram.filters import Command
 
 router = Router()
@@ -8,53 +11,68 @@ router = Router()
 @router.message(Command("addsub"))
 async def add_subscription(message: types.Message):
     """
-    Usage: /addsub Netflix 15
+    Usage: /addsub Netflix 15 [billing day]
     """
-    args = message.text.split(maxsplit=2)
-    if len(args) != 3:
-        await message.answer("⚠️ Usage: `/addsub Name Amount`\nExample: `/addsub Netflix 15.99`")
-        return
+    args = message.text.split()
+    if len(args) not in (3, 4):
+        return message.answer(
+            "⚠️ Usage: `/addsub Name Amount [BillingDay]`\nExample: `/addsub Netflix 15.99 5`"
+        )
 
     name = args[1]
     try:
         amount = float(args[2])
     except ValueError:
-        await message.answer("❌ Amount must be a number.")
-        return
+        return message.answer("❌ Amount must be a number.")
 
-    async with AsyncSessionLocal() as session:
-        sub = Subscription(user_id=message.from_user.id, name=name, amount=amount)
-        session.add(sub)
-        await session.commit()
+    billing_day = 1
+    if len(args) == 4:
+        if not args[3].isdigit() or not 1 <= int(args[3]) <= 31:
+            return message.answer("❌ Billing day must be a day of the month (1-31).")
+        billing_day = int(args[3])
 
-    await message.answer(f"✅ Added subscription: <b>{name}</b> (${amount:.2f}/mo)", parse_mode="HTML")
+    await insert_row(Subscription, {
+        "user_id": message.from_user.id, "name": name, "amount": amount,
+        "billing_day": billing_day, "starts_month": first_billing_month(billing_day),
+    })
+    invalidate(message.from_user.id)
+
+    return message.answer(
+        f"✅ Added subscription: <b>{name}</b> (${amount:.2f}/mo, charged on day {billing_day})",
+        parse_mode="HTML"
+    )
 
 @router.message(F.text == "🔄 Subscriptions")
 async def list_subscriptions(message: types.Message):
-    async with AsyncSessionLocal() as session:
-        result = await session.execute(select(Subscription).where(Subscription.user_id == message.from_user.id))
-        subs = result.scalars().all()
+    subs = (await get_user_profile(message.from_user.id)).subscriptions
 
     if not subs:
-        await message.answer("You have no subscriptions yet.\nAdd one using: `/addsub Name Amount`")
-        return
+        return message.answer("You have no subscriptions yet.\nAdd one using: `/addsub Name Amount`")
 
-    total = sum(s.amount for s in subs)
+    total = sum(amount for _, _, amount, _ in subs)
     text = "🔄 <b>Monthly Subscriptions</b>\n──────────────────\n"
     
-    for s in subs:
-        text += f"• {s.name}: <code>${s.amount:.2f}</code> /delete_sub_{s.id}\n"
+    for sub_id, name, amount, _ in subs:
+        text += f"• {name}: <code>${amount:.2f}</code> /delete_sub_{sub_id}\n"
     
     text += f"──────────────────\n<b>Total Fixed Cost:</b> <code>${total:.2f}</code>"
     
-    await message.answer(text, parse_mode="HTML")
+    return message.answer(text, parse_mode="HTML")
 
 @router.message(F.text.startswith("/delete_sub_"))
 async def delete_subscription(message: types.Message):
     sub_id = int(message.text.split("_")[2])
     
     async with AsyncSessionLocal() as session:
-        await session.execute(delete(Subscription).where(Subscription.id == sub_id))
+        # Only the owner can remove a subscription
+        deleted = await session.execute(
+            delete(Subscription).where(Subscription.id == sub_id, Subscription.user_id == message.from_user.id)
+            .returning(Subscription.id)
+        )
+        if deleted.first():
+            # Past charges stay in the expenses, only the ledger entries go
+            await session.execute(delete(SubscriptionCharge).where(SubscriptionCharge.subscription_id == sub_id))
         await session.commit()
+    invalidate(message.from_user.id)
     
-    await message.answer("✅ Subscription removed.")
\ No newline at end of file
+    return message.answer("✅ Subscription removed.")
\ No newline at end of file
@@ -0,0 +1,27 @@
+"""
+Archives expenses older than N full months into monthly summaries
+(the bot does this daily when ARCHIVE_AFTER_MONTHS is set).
+The archived rows are deleted: only their monthly per-category totals remain.
+
+Usage (from the project root, uses DATABASE_URL like the bot):
+    python -m scripts.archive_expenses      # ARCHIVE_AFTER_MONTHS
+    python -m scripts.archive_expenses 12   # keep the last 12 months live
+"""
+import asyncio
+import sys
+from data.database import engine, init_db
+from data.archive import archive_expenses, archive_cutoff, ARCHIVE_AFTER_MONTHS
+
+
+async def main(months):
+    await init_db() # also creates upcoming partitions on Postgres
+    archived = await archive_expenses(months)
+    await engine.dispose()
+    print(f"Archived {archived} expense(s) dated before {archive_cutoff(months):%Y-%m-%d}.")
+
+
+if __name__ == "__main__":
+    months = int(sys.argv[1]) if len(sys.argv) > 1 else ARCHIVE_AFTER_MONTHS
+    if months < 1:
+        sys.exit("Months must be at least 1 (pass them or set ARCHIVE_AFTER_MONTHS)")
+    asyncio.run(main(months))
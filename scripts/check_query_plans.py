@@ -0,0 +1,96 @@
+"""
+Prints the query plan of the hot per-user queries and checks they use an index.
+
+Usage (from the project root, uses DATABASE_URL like the bot):
+    python -m scripts.check_query_plans
+
+Exits with status 1 if any query falls back to a full table scan.
+"""
+import asyncio
+import sys
+from datetime import datetime, timedelta
+from data.database import engine, init_db
+from data.rollups import category_totals_query, year_month
+from data.history import history_page_query
+from data.analytics import analytics_window, daily_category_totals_query, forecast_query
+
+SAMPLE_USER_ID = 1
+
+
+def hot_queries():
+    now = datetime.utcnow()
+    return {
+        # history.show_history / page_history
+        "show_history": history_page_query(SAMPLE_USER_ID),
+        "show_history (older page)": history_page_query(SAMPLE_USER_ID, older_than=(now, 1000)),
+        "show_history (newer page)": history_page_query(SAMPLE_USER_ID, newer_than=(now, 1000)),
+        "show_history (month filter)": history_page_query(
+            SAMPLE_USER_ID, older_than=(now, 1000), month=year_month(now)
+        ),
+        # statistics.generate_stats ("Last Month")
+        "generate_stats": category_totals_query(
+            SAMPLE_USER_ID, year_month(datetime(now.year, now.month, 1) - timedelta(days=1)), year_month(now)
+        ),
+        # insights.generate_forecast
+        "generate_forecast": daily_category_totals_query(
+            engine.dialect.name, SAMPLE_USER_ID, *analytics_window(now), exclude_subscription_charges=True
+        ),
+        "generate_forecast (profile not cached)": forecast_query(
+            engine.dialect.name, SAMPLE_USER_ID, *analytics_window(now), exclude_subscription_charges=True
+        ),
+    }
+
+
+async def explain(conn, statement):
+    # render_postcompile expands IN (...) lists into plain bound parameters
+    compiled = statement.compile(dialect=conn.dialect, compile_kwargs={"render_postcompile": True})
+    params = tuple(compiled.params[name] for name in compiled.positiontup)
+
+    if conn.dialect.name == "sqlite":
+        result = await conn.exec_driver_sql("EXPLAIN QUERY PLAN " + compiled.string, params)
+        return [row[-1] for row in result]
+
+    result = await conn.exec_driver_sql("EXPLAIN " + compiled.string, params)
+    return [row[0] for row in result]
+
+
+def uses_index(plan_lines):
+    # SQLite also "scans" subqueries (co-routines) and constant rows, which are no tables
+    subqueries = {line.split()[-1] for line in plan_lines if line.startswith(("CO-ROUTINE ", "MATERIALIZE "))}
+    for line in plan_lines:
+        if line.startswith("SCAN ") and "INDEX" not in line:  # SQLite full scan
+            if line == "SCAN CONSTANT ROW" or line.split()[1] in subqueries:
+                continue
+            return False
+        if "Seq Scan" in line:  # Postgres full scan
+            return False
+    return True
+
+
+async def main():
+    await init_db()
+    failed = []
+
+    async with engine.connect() as conn:
+        if conn.dialect.name == "postgresql":
+            # Tiny tables make a seq scan "cheaper"; we want to know whether an index *can* be used
+            await conn.exec_driver_sql("SET enable_seqscan = off")
+
+        for name, statement in hot_queries().items():
+            plan = await explain(conn, statement)
+            ok = uses_index(plan)
+            if not ok:
+                failed.append(name)
+            print(f"[{'OK' if ok else 'FULL SCAN'}] {name}")
+            for line in plan:
+                print(f"    {line}")
+
+    await engine.dispose()
+    if failed:
+        print(f"\n{len(failed)} query(s) not using an index: {', '.join(failed)}")
+        sys.exit(1)
+    print("\nAll hot queries use an index.")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,86 @@
+"""
+Startup-time and import-cost report for the bot.
+
+Usage (from the project root):
+    python -m scripts.import_cost [--top 15] [--max-ms 8000]
+
+Imports `bot` in a fresh interpreter with `-X importtime`, prints the most
+expensive imports, the wall time and the peak RSS of that process. Exits with
+status 1 if a heavy library (pandas, matplotlib, reportlab, openpyxl, numpy) is
+imported at startup, or if the import time exceeds --max-ms.
+"""
+import argparse
+import os
+import subprocess
+import sys
+import time
+
+HEAVY_MODULES = ("pandas", "matplotlib", "reportlab", "openpyxl", "numpy")
+
+# Runs in the child: import the bot, then report peak RSS (KiB on Linux) and heavy modules loaded
+CHILD = (
+    "import resource, sys, bot; "
+    "print('RSS', resource.getrusage(resource.RUSAGE_SELF).ru_maxrss); "
+    "print('HEAVY', ','.join(m for m in %r if m in sys.modules))" % (HEAVY_MODULES,)
+)
+
+
+def parse_importtime(stderr):
+    """Returns [(module, self_us, cumulative_us), ...] from -X importtime output."""
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        try:
+            self_us, cumulative_us, name = line[len("import time:"):].split("|")
+            # Nested imports are indented below the module that triggered them
+            rows.append((name[1:].rstrip(), int(self_us), int(cumulative_us)))
+        except ValueError:
+            continue
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--top", type=int, default=15, help="number of imports of bot.py to list")
+    parser.add_argument("--max-ms", type=float, default=None, help="fail if importing bot takes longer")
+    args = parser.parse_args()
+
+    env = dict(os.environ, BOT_TOKEN=os.getenv("BOT_TOKEN", "0:import-cost"))
+    started = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", CHILD],
+        capture_output=True, text=True, env=env
+    )
+    wall_ms = (time.perf_counter() - started) * 1000
+    if result.returncode != 0:
+        print(result.stderr[-2000:])
+        sys.exit("Importing bot failed")
+
+    info = dict(line.split(" ", 1) for line in result.stdout.splitlines() if line.startswith(("RSS ", "HEAVY ")))
+    heavy = [m for m in info.get("HEAVY", "").strip().split(",") if m]
+    rows = parse_importtime(result.stderr)
+    total_ms = sum(self_us for _, self_us, _ in rows) / 1000
+
+    # Direct imports of bot.py (nested imports are indented two spaces per level)
+    direct = sorted((r for r in rows if len(r[0]) - len(r[0].lstrip()) == 2), key=lambda r: r[2], reverse=True)
+    print(f"{'cumulative ms':>14}  module")
+    for name, _, cumulative_us in direct[:args.top]:
+        print(f"{cumulative_us / 1000:14.1f}  {name.strip()}")
+
+    print(f"\nImport time: {total_ms:.0f} ms ({len(rows)} modules)")
+    print(f"Interpreter wall time: {wall_ms:.0f} ms")
+    print(f"Peak RSS: {int(info.get('RSS', 0)) / 1024:.1f} MB")
+
+    failed = False
+    if heavy:
+        print(f"FAIL: heavy modules imported at startup: {', '.join(heavy)}")
+        failed = True
+    if args.max_ms is not None and total_ms > args.max_ms:
+        print(f"FAIL: import time {total_ms:.0f} ms exceeds {args.max_ms:.0f} ms")
+        failed = True
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,50 @@
+"""
+Converts `expenses` into a table partitioned by month (Postgres only, see data/partitions.py).
+
+Stop the bot first. The table is renamed, an empty partitioned `expenses` with a
+partition per month is created, and the rows are copied over in batches of
+--batch-size, each batch in its own transaction. A run that was interrupted
+continues where it stopped when started again.
+
+Usage (from the project root, uses DATABASE_URL like the bot):
+    python -m scripts.partition_expenses
+    python -m scripts.partition_expenses --batch-size 50000
+"""
+import argparse
+import asyncio
+import sys
+from data.database import engine, init_db
+from data.partitions import start_partitioning, copy_batch, finish_partitioning, partitioning_in_progress
+
+
+async def main(batch_size):
+    if engine.dialect.name != "postgresql":
+        sys.exit("Only Postgres tables can be partitioned.")
+    await init_db()
+
+    async with engine.begin() as conn:
+        if not await conn.run_sync(partitioning_in_progress):
+            if not await conn.run_sync(start_partitioning):
+                print("expenses is already partitioned.")
+                await engine.dispose()
+                return
+
+    copied = 0
+    while True:
+        async with engine.begin() as conn:
+            rows = await conn.run_sync(copy_batch, batch_size)
+        if not rows:
+            break
+        copied += rows
+        print(f"Copied {copied} expense(s)...", flush=True)
+
+    async with engine.begin() as conn:
+        await conn.run_sync(finish_partitioning)
+    await engine.dispose()
+    print(f"Done: expenses is partitioned by month ({copied} expense(s) copied).")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Partition the expenses table by month (Postgres).")
+    parser.add_argument("--batch-size", type=int, default=10000, help="rows copied per transaction")
+    asyncio.run(main(parser.parse_args().batch_size))
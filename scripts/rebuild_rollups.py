@@ -0,0 +1,32 @@
+"""
+Recomputes the monthly category rollups from the raw expenses.
+
+Usage (from the project root, uses DATABASE_URL like the bot):
+    python -m scripts.rebuild_rollups            # every user
+    python -m scripts.rebuild_rollups 123456789  # a single Telegram user id
+"""
+import asyncio
+import sys
+from sqlalchemy import select, func
+from data.database import AsyncSessionLocal, ExpenseRollup, engine, init_db
+from data.rollups import rebuild_rollups
+
+
+async def main(user_id=None):
+    await init_db()
+
+    async with AsyncSessionLocal() as session:
+        await rebuild_rollups(session, user_id)
+        await session.commit()
+
+        query = select(func.count()).select_from(ExpenseRollup)
+        if user_id is not None:
+            query = query.where(ExpenseRollup.user_id == user_id)
+        buckets = await session.scalar(query)
+
+    await engine.dispose()
+    print(f"Rebuilt {buckets} rollup bucket(s) for {'user ' + str(user_id) if user_id else 'all users'}.")
+
+
+if __name__ == "__main__":
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else None))
@@ -0,0 +1,103 @@
+from datetime import datetime, timedelta
+import pytest
+from utils.forecast import analyze, MIN_PROJECTION_DAYS
+
+NOW = datetime(2026, 3, 18, 15, 0) # a Wednesday, 13 days left in March
+
+
+def daily(start, end, amount=10.0, category="Food"):
+    """One `amount` row per day in [start, end]."""
+    rows, day = [], start
+    while day <= end:
+        rows.append((f"{day:%Y-%m-%d}", category, amount))
+        day += timedelta(days=1)
+    return rows
+
+
+def test_no_rows():
+    assert analyze([], NOW) is None
+
+
+def test_first_expense_today_is_not_projected_over_the_month():
+    analysis = analyze([("2026-03-18", "Food", 200.0)], NOW)
+    assert analysis.spent_this_month == 200.0
+    assert analysis.projected_month is None
+    assert analysis.avg_7d == analysis.avg_30d == 0.0
+    assert analysis.weekday_factors == (1.0,) * 7
+
+
+def test_projection_needs_a_week_of_history():
+    short = daily(datetime(2026, 3, 18) - timedelta(days=MIN_PROJECTION_DAYS - 1), datetime(2026, 3, 18))
+    assert analyze(short, NOW).projected_month is None
+
+    week = daily(datetime(2026, 3, 18) - timedelta(days=MIN_PROJECTION_DAYS), datetime(2026, 3, 18))
+    analysis = analyze(week, NOW)
+    # 8 days spent so far, 13 more at the 10/day average
+    assert analysis.projected_month == pytest.approx(80.0 + 13 * 10.0)
+
+
+def test_today_does_not_count_towards_the_averages():
+    rows = daily(datetime(2026, 3, 1), datetime(2026, 3, 17)) + [("2026-03-18", "Food", 500.0)]
+    analysis = analyze(rows, NOW)
+    assert analysis.avg_7d == analysis.avg_30d == pytest.approx(10.0)
+    assert analysis.projected_month == pytest.approx(170.0 + 500.0 + 13 * 10.0)
+
+
+def test_one_big_day_does_not_make_a_busy_weekday():
+    rows = daily(datetime(2026, 2, 1), datetime(2026, 3, 17))
+    rows.append(("2026-03-14", "Gifts", 300.0)) # a Saturday
+    factors = analyze(rows, NOW).weekday_factors
+    # Unshrunk, this one Saturday made every Saturday 3.6x an average day
+    assert factors[5] < 2.5
+    assert all(0.5 < f < 1.0 for i, f in enumerate(factors) if i != 5)
+
+
+def test_no_weekday_factors_before_four_weeks():
+    rows = daily(datetime(2026, 2, 25), datetime(2026, 3, 17))
+    rows.append(("2026-03-14", "Gifts", 300.0))
+    assert analyze(rows, NOW).weekday_factors == (1.0,) * 7
+
+
+def test_steady_weekly_pattern_is_found():
+    rows = daily(datetime(2025, 12, 1), datetime(2026, 3, 17))
+    rows += [(day, "Bar", 60.0) for day, _, _ in rows if datetime.strptime(day, "%Y-%m-%d").weekday() == 4]
+    factors = analyze(rows, NOW).weekday_factors
+    assert max(range(7), key=lambda d: factors[d]) == 4
+    assert factors[4] > 2.0
+
+
+def _month_day(first_day, months_later):
+    """"YYYY-MM-DD" `months_later` months after `first_day`, same day of the month."""
+    index = first_day.year * 12 + first_day.month - 1 + months_later
+    return f"{index // 12}-{index % 12 + 1:02d}-{first_day.day:02d}"
+
+
+def test_trend_counts_a_first_month_started_on_the_first():
+    # Oct (from the 1st), Nov, Dec, Jan, Feb complete; March still running
+    rows = [(_month_day(datetime(2025, 10, 1), i), "Rent", 100.0 + 10 * i) for i in range(6)]
+    category, slope, mean = analyze(rows, NOW).trends[0]
+    assert category == "Rent"
+    assert slope == pytest.approx(10.0)
+    assert mean == pytest.approx(120.0) # Oct-Feb: 100..140
+
+
+def test_trend_skips_a_partial_first_month():
+    # The first expense on Oct 20: October is left out, Nov-Feb remain
+    rows = [("2025-10-20", "Rent", 999.0)] + [(_month_day(datetime(2025, 11, 1), i), "Rent", 100.0 + 10 * i) for i in range(5)]
+    category, slope, mean = analyze(rows, NOW).trends[0]
+    assert slope == pytest.approx(10.0)
+    assert mean == pytest.approx(115.0) # Nov-Feb: 100..130
+
+
+def test_no_trend_from_too_few_complete_months():
+    rows = [("2025-12-15", "Rent", 50.0), ("2026-01-01", "Rent", 100.0), ("2026-02-01", "Rent", 200.0)]
+    assert analyze(rows, NOW).trends == []
+
+
+def test_anomaly():
+    rows = [(day, "Coffee", 10.0 + i % 3) for i, (day, _, _) in enumerate(daily(datetime(2026, 1, 1), datetime(2026, 3, 17)))]
+    rows = [row for row in rows if row[0] != "2026-03-10"] + [("2026-03-10", "Coffee", 90.0)]
+    anomalies = analyze(rows, NOW).anomalies
+    assert [(f"{day:%Y-%m-%d}", category, amount) for day, category, amount, _ in anomalies] == [
+        ("2026-03-10", "Coffee", 90.0)
+    ]
@@ -0,0 +1,61 @@
+from datetime import datetime
+import pandas as pd
+import pytest
+from handlers.import_data import clean_chunk
+
+IMPORTED_AT = datetime(2024, 5, 1, 12, 0)
+
+
+def _amounts(values):
+    chunk = pd.DataFrame({"amount": values, "category": ["food"] * len(values)}, dtype=str)
+    rows, rejected = clean_chunk(chunk, 1, IMPORTED_AT)
+    return [row["amount"] for row in rows], rejected
+
+
+@pytest.mark.parametrize("raw, expected", [
+    ("12", 12.0),
+    ("12.5", 12.5),
+    (" 7 ", 7.0),
+    ("-3", -3.0),
+    ("1e3", 1000.0),
+    ("12,50", 12.5),
+    ("€ 9,99", 9.99),
+    ("$12", 12.0),
+    ("$1,234.50", 1234.5),
+    ("1,234", 1234.0),
+    ("15 usd", 15.0),
+    ("-$4.20", -4.2),
+])
+def test_amounts(raw, expected):
+    amounts, rejected = _amounts([raw])
+    assert amounts == [pytest.approx(expected)]
+    assert rejected == {}
+
+
+@pytest.mark.parametrize("raw", ["12.5.3", "1,2,3", "abc", "12 apples", "1-2", "inf", "nan", "$", ""])
+def test_bad_amounts_are_rejected(raw):
+    amounts, rejected = _amounts([raw])
+    assert amounts == []
+    assert rejected == {"bad amount": 1}
+
+
+def test_missing_amount_is_rejected():
+    chunk = pd.DataFrame({"amount": [None, "5"], "category": ["food", "food"]})
+    rows, rejected = clean_chunk(chunk, 1, IMPORTED_AT)
+    assert [row["amount"] for row in rows] == [5.0]
+    assert rejected == {"bad amount": 1}
+
+
+def test_rows():
+    chunk = pd.DataFrame({
+        "Amount": ["10", "x", "4", "6"],
+        "Category": [" coffee ", "food", None, "taxi"],
+        "Description": ["latte", None, None, None],
+        "Date": ["2024-03-02", None, None, "not a date"],
+    }, dtype=str)
+    rows, rejected = clean_chunk(chunk, 42, IMPORTED_AT)
+    assert rows == [{
+        "user_id": 42, "amount": 10.0, "category": "Coffee",
+        "description": "latte", "timestamp": datetime(2024, 3, 2),
+    }]
+    assert rejected == {"bad amount": 1, "missing category": 1, "bad date": 1}
@@ -0,0 +1,69 @@
+import pytest
+from utils.quick_add import parse_amount, parse_entry, parse_entries
+
+
+@pytest.mark.parametrize("entry, expected", [
+    ("15 Food", (15.0, "Food")),
+    ("Taxi 20", (20.0, "Taxi")),
+    ("food 12.5", (12.5, "Food")),
+    ("$4.50 coffee", (4.5, "Coffee")),
+    ("15 usd lunch", (15.0, "Lunch")),
+    ("Lunch 12,50", (12.5, "Lunch")),
+    ("€ 3,50 bus", (3.5, "Bus")),
+    ("Rent - 1,200", (1200.0, "Rent")),
+    ("Rent 1'200", (1200.0, "Rent")),
+    ("1,234.50 laptop", (1234.5, "Laptop")),
+    ("12: Taxi", (12.0, "Taxi")),
+    ("Food - 12", (12.0, "Food")),
+    ("3 coffee to go", (3.0, "Coffee To Go")),
+])
+def test_parse_entry(entry, expected):
+    assert parse_entry(entry) == expected
+
+
+@pytest.mark.parametrize("entry", [
+    "hello",
+    "15",
+    "15 20",
+    "0 Food",
+    "Food 1000000000",
+    "12 " + "x" * 65,
+    # Ambiguous: 200 for "Rent 1" or 1200 for "Rent"?
+    "Rent 1 200",
+    "1 200 Rent",
+    "12 Bus 2",
+    # Negative amounts / refunds are not expenses
+    "Food -5",
+    "Refund -20",
+    "Refund -$20",
+])
+def test_parse_entry_rejects(entry):
+    assert parse_entry(entry) is None
+
+
+def test_parse_entries():
+    parsed, rejected = parse_entries("15 Food\nTaxi 20; Lunch 12,50\n\nnonsense;  ;Rent 1 200")
+    assert parsed == [(15.0, "Food"), (20.0, "Taxi"), (12.5, "Lunch")]
+    assert rejected == ["nonsense", "Rent 1 200"]
+
+
+def test_parse_entries_rejects_negative_amounts():
+    parsed, rejected = parse_entries("Food -5\nRefund -20; Taxi - 20")
+    assert parsed == [(20.0, "Taxi")]
+    assert rejected == ["Food -5", "Refund -20"]
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("12", 12.0),
+    ("12,50", 12.5),
+    ("€ 9,99", 9.99),
+    ("$1,234.50", 1234.5),
+    ("-4.20", -4.2),
+    ("20 eur", 20.0),
+    ("1e3", None),
+    ("12.5.3", None),
+    ("12 apples", None),
+    ("", None),
+])
+def test_parse_amount(text, expected):
+    assert parse_amount(text) == expected
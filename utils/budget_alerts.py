@@ -0,0 +1,140 @@
+"""
+Budget alerts at 80% and 100% of the monthly budget.
+
+Handlers that add expenses opt in with a flag:
+
+    @router.message(F.text, flags={"budget_alert": True})
+
+After such a handler ran, `BudgetAlertMiddleware` compares the user's running
+month-to-date total (`monthly_totals`, maintained with the rollups) with their
+budget. When a threshold is crossed, `monthly_totals.alerted` is raised with a
+conditional UPDATE, so each threshold fires at most once per user and month even
+with concurrent updates. Expenses added outside of handlers (subscription charges)
+are followed by `alert_users`. `run_reconciliation` corrects the running totals against
+the expenses every RECONCILE_INTERVAL_SECONDS.
+"""
+import os
+import asyncio
+import logging
+from datetime import datetime
+from aiogram import BaseMiddleware
+from aiogram.dispatcher.flags import get_flag
+from aiogram.methods import TelegramMethod
+from sqlalchemy import select, update
+from data.database import AsyncSessionLocal, MonthlyTotal
+from data.partitions import add_months, month_start
+from data.rollups import year_month, reconcile_month_totals
+from data.user_cache import get_user_profile
+from utils.metrics import BUDGET_ALERTS
+
+logger = logging.getLogger(__name__)
+
+BUDGET_ALERT_THRESHOLDS = (80, 100) # percent of the budget
+RECONCILE_INTERVAL_SECONDS = int(os.getenv("BUDGET_RECONCILE_SECONDS", 3600))
+
+ALERT_TEXTS = {
+    80: "⚠️ <b>Budget alert:</b> you have used {percent:.0f}% of your monthly budget "
+        "(<code>${total:,.2f}</code> of <code>${budget:,.2f}</code>).",
+    100: "🚨 <b>Budget exceeded:</b> you have spent <code>${total:,.2f}</code> "
+         "of your <code>${budget:,.2f}</code> monthly budget.",
+}
+
+
+async def claim_budget_alert(user_id, now=None):
+    """
+    Returns (threshold, total, budget) if the user just crossed a threshold that was not
+    alerted yet this month, marking it as alerted; otherwise None.
+    """
+    budget = (await get_user_profile(user_id)).budget_limit
+    if not budget or budget <= 0:
+        return None
+
+    ym = year_month(now or datetime.utcnow())
+    this_month = (MonthlyTotal.user_id == user_id, MonthlyTotal.year_month == ym)
+    async with AsyncSessionLocal() as session:
+        row = (await session.execute(select(MonthlyTotal.total, MonthlyTotal.alerted).where(*this_month))).first()
+        if row is None:
+            return None
+        percent = row.total / budget * 100
+        threshold = max((t for t in BUDGET_ALERT_THRESHOLDS if percent >= t), default=0)
+        if threshold <= row.alerted:
+            return None
+
+        # Only one of several concurrent updates wins the threshold
+        claimed = await session.execute(
+            update(MonthlyTotal).where(*this_month, MonthlyTotal.alerted < threshold)
+            .values(alerted=threshold).returning(MonthlyTotal.total)
+        )
+        total = claimed.scalar()
+        await session.commit()
+    if total is None:
+        return None
+    return threshold, total, budget
+
+
+async def _send_alert(bot, chat_id, alert):
+    threshold, total, budget = alert
+    await bot.send_message(
+        chat_id,
+        ALERT_TEXTS[threshold].format(percent=total / budget * 100, total=total, budget=budget),
+        parse_mode="HTML",
+    )
+    BUDGET_ALERTS.labels(str(threshold)).inc()
+
+
+async def alert_users(bot, user_ids):
+    """Sends the due alerts of users whose spending changed outside of a handler, in their private chat."""
+    for user_id in user_ids:
+        try:
+            alert = await claim_budget_alert(user_id)
+            if alert is not None:
+                await _send_alert(bot, user_id, alert)
+        except Exception:
+            logger.exception("Budget alert failed for user %s", user_id)
+
+
+class BudgetAlertMiddleware(BaseMiddleware):
+    async def __call__(self, handler, event, data):
+        result = await handler(event, data)
+        user = data.get("event_from_user")
+        chat = data.get("event_chat")
+        if not get_flag(data, "budget_alert") or user is None or chat is None:
+            return result
+
+        try:
+            alert = await claim_budget_alert(user.id)
+            if alert is None:
+                return result
+            bot = data["bot"]
+            if isinstance(result, TelegramMethod):
+                # Send the handler's own reply first, the alert follows it
+                await bot(result)
+                result = None
+            await _send_alert(bot, chat.id, alert)
+        except Exception:
+            logger.exception("Budget alert failed for user %s", user.id)
+        return result
+
+
+def setup_budget_alerts(dp):
+    middleware = BudgetAlertMiddleware()
+    # Inner middleware: flags are only known once the handler has been resolved
+    dp.message.middleware(middleware)
+    return middleware
+
+
+async def run_reconciliation(interval=RECONCILE_INTERVAL_SECONDS):
+    """Corrects this month's and last month's running totals from the expenses."""
+    while True:
+        try:
+            this_month = month_start(datetime.utcnow())
+            async with AsyncSessionLocal() as session:
+                drifted = 0
+                for month in (add_months(this_month, -1), this_month):
+                    drifted += await reconcile_month_totals(session, month, add_months(month, 1))
+                await session.commit()
+            if drifted:
+                logger.warning("Corrected %d drifted month-to-date total(s)", drifted)
+        except Exception:
+            logger.exception("Month total reconciliation failed")
+        await asyncio.sleep(interval)
@@ -0,0 +1,62 @@
+"""
+Remembers the Telegram file_id of every rendered Stats chart.
+
+Entries are keyed by a hash of what the chart shows (period title, category totals,
+budget), so an unchanged report is re-sent by file_id without rendering or uploading.
+When a user's expenses change, the new totals hash differently and the user's
+previous chart for that period is dropped. Size is bounded with LRU eviction.
+"""
+import os
+import json
+import hashlib
+from collections import OrderedDict
+
+CHART_CACHE_SIZE = int(os.getenv("CHART_CACHE_SIZE", 1000))
+
+_file_ids = OrderedDict()  # digest -> file_id, least recently used first
+_latest = {}               # (user_id, period) -> digest of the last chart sent
+hits = 0
+misses = 0
+
+
+def chart_digest(title, totals, budget):
+    payload = json.dumps(
+        [title, sorted((category, round(total, 2)) for category, total in totals.items()), round(budget, 2)]
+    )
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def get_file_id(digest):
+    global hits, misses
+    file_id = _file_ids.get(digest)
+    if file_id is not None:
+        hits += 1
+        _file_ids.move_to_end(digest)
+    else:
+        misses += 1
+    return file_id
+
+
+def remember(user_id, period, digest, file_id):
+    previous = _latest.get((user_id, period))
+    if previous is not None and previous != digest:
+        # The user's data changed since that chart was sent
+        _file_ids.pop(previous, None)
+    _latest[(user_id, period)] = digest
+
+    _file_ids[digest] = file_id
+    _file_ids.move_to_end(digest)
+    while len(_file_ids) > CHART_CACHE_SIZE:
+        _file_ids.popitem(last=False)
+    if len(_latest) > CHART_CACHE_SIZE:
+        # Forget pointers whose chart was already evicted
+        for key in [k for k, d in _latest.items() if d not in _file_ids]:
+            del _latest[key]
+
+
+def forget(digest):
+    _file_ids.pop(digest, None)
+
+
+def cache_stats():
+    return {"hits": hits, "misses": misses, "size": len(_file_ids)}
@@ -0,0 +1,69 @@
+import io
+import os
+import asyncio
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+# Number of worker processes used to render charts (env: CHART_WORKERS)
+CHART_WORKERS = int(os.getenv("CHART_WORKERS", 2))
+
+_pool = None
+
+
+def render_pie_chart(labels, values, title):
+    """
+    Draws a pie chart and returns it as PNG bytes.
+    Uses the object-oriented Figure/Agg API, so no pyplot global state is involved.
+    """
+    from matplotlib.figure import Figure
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+    fig = Figure(figsize=(6, 6))
+    FigureCanvasAgg(fig)
+    ax = fig.add_subplot()
+    ax.pie(values, labels=labels, autopct='%1.1f%%', startangle=140)
+    ax.set_title(title)
+
+    buf = io.BytesIO()
+    fig.savefig(buf, format='png')
+    return buf.getvalue()
+
+
+def _warm_up_worker():
+    # Pays the matplotlib import + font cache cost once per worker process
+    render_pie_chart(["warm-up"], [1], "warm-up")
+
+
+def _ping():
+    return os.getpid()
+
+
+def _get_pool():
+    global _pool
+    if _pool is None:
+        # spawn: created inside the running bot, a fork would copy its event loop, DB
+        # connections and locks (same rule as utils/export_worker.py)
+        _pool = ProcessPoolExecutor(
+            max_workers=CHART_WORKERS, mp_context=multiprocessing.get_context("spawn"),
+            initializer=_warm_up_worker
+        )
+    return _pool
+
+
+async def start_chart_pool():
+    """Starts every worker up front so the first user chart doesn't wait for warm-up."""
+    loop = asyncio.get_running_loop()
+    pool = _get_pool()
+    await asyncio.gather(*(loop.run_in_executor(pool, _ping) for _ in range(CHART_WORKERS)))
+
+
+def shutdown_chart_pool():
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(cancel_futures=True)
+        _pool = None
+
+
+async def render_chart(labels, values, title):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_get_pool(), render_pie_chart, list(labels), list(values), title)
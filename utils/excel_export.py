@@ -0,0 +1,54 @@
+from collections import defaultdict
+
+
+def write_expenses_workbook(rows, path, monthly_summary=True, archived=()):
+    """
+    Writes expense rows (timestamp, category, description, amount, id) to an .xlsx file
+    using an openpyxl write-only workbook, so rows are flushed to disk as they arrive.
+    `archived` holds (year_month, category, total, count) summaries of archived months;
+    they are appended as one line each and counted in the summary.
+    Optionally adds a "Monthly Summary" sheet. Returns the number of expenses written.
+    """
+    from openpyxl import Workbook
+
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet("Expenses")
+    ws.append(["Date", "Category", "Description", "Amount", "ID"])
+
+    # (month, category) -> [total, count]; small no matter how long the history is
+    months = defaultdict(lambda: [0.0, 0])
+    count = 0
+
+    for timestamp, category, description, amount, expense_id in rows:
+        ws.append([timestamp.strftime("%Y-%m-%d %H:%M"), category, description, amount, expense_id])
+        bucket = months[(timestamp.strftime("%Y-%m"), category)]
+        bucket[0] += amount
+        bucket[1] += 1
+        count += 1
+
+    for month, category, total, n in archived:
+        ws.append([month, category, f"Archived: {n} expense(s)", round(total, 2), None])
+        bucket = months[(month, category)]
+        bucket[0] += total
+        bucket[1] += n
+        count += n
+
+    if monthly_summary:
+        summary = wb.create_sheet("Monthly Summary")
+        summary.append(["Month", "Category", "Total", "Count"])
+        current_month = None
+        month_total = 0.0
+        # Newest month first, categories alphabetical within a month
+        ordered = sorted(sorted(months.items()), key=lambda item: item[0][0], reverse=True)
+        for (month, category), (total, n) in ordered:
+            if current_month is not None and month != current_month:
+                summary.append([current_month, "TOTAL", round(month_total, 2), None])
+                month_total = 0.0
+            current_month = month
+            month_total += total
+            summary.append([month, category, round(total, 2), n])
+        if current_month is not None:
+            summary.append([current_month, "TOTAL", round(month_total, 2), None])
+
+    wb.save(path)
+    return count
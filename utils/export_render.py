@@ -0,0 +1,47 @@
+"""
+Builds export files inside an export worker process (see utils/export_worker.py).
+
+Each call runs its own short event loop: rows are streamed from the database and
+fed to the ReportLab / openpyxl writer in a thread, exactly like the inline
+exports did, but in a separate process so rendering never competes with the
+bot's event loop for the GIL.
+"""
+import asyncio
+from datetime import datetime
+from data.database import engine
+from data.exports import stream_expense_rows, archived_summaries
+from utils.streaming import stream_to_thread
+
+
+def warm_up_worker():
+    # Pays the ReportLab / openpyxl import cost once per worker process
+    import reportlab.pdfgen.canvas # noqa: F401
+    import openpyxl # noqa: F401
+
+
+async def _build(kind, path, user_id, params):
+    start_date = datetime.fromisoformat(params["start"]) if params.get("start") else None
+    end_date = datetime.fromisoformat(params["end"]) if params.get("end") else None
+    try:
+        # Archived months come after the streamed rows, which are newest first
+        archived = await archived_summaries(user_id, start_date, end_date)
+        rows = stream_expense_rows(user_id, start_date, end_date)
+        if kind == "pdf":
+            from utils.pdf_generator import generate_receipt_pdf
+            return await stream_to_thread(
+                rows, lambda r: generate_receipt_pdf(
+                    params.get("first_name", ""), r, path, start_date, end_date, archived
+                )
+            )
+        from utils.excel_export import write_expenses_workbook
+        return await stream_to_thread(
+            rows, lambda r: write_expenses_workbook(r, path, monthly_summary=True, archived=archived)
+        )
+    finally:
+        # Connections belong to this call's event loop
+        await engine.dispose()
+
+
+def build_export(kind, path, user_id, params):
+    """Writes the export to `path` and returns the number of expenses in it."""
+    return asyncio.run(_build(kind, path, user_id, params))
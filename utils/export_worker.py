@@ -0,0 +1,147 @@
+"""
+Worker coroutines delivering queued exports (data/export_jobs.py).
+
+EXPORT_WORKERS coroutines claim jobs from the database and hand the rendering to
+a pool of as many worker processes, then send the finished file to the chat.
+Enqueueing wakes them up immediately; otherwise they poll every
+JOB_POLL_SECONDS, which is also how jobs queued before a restart are picked up.
+"""
+import os
+import json
+import asyncio
+import logging
+import tempfile
+import multiprocessing
+from contextlib import suppress
+from datetime import timedelta
+from concurrent.futures import ProcessPoolExecutor
+from aiogram.types import FSInputFile
+from data.export_jobs import (
+    claim_next_job, heartbeat, finish_job, requeue_stale_jobs, delete_finished_jobs
+)
+from utils.export_render import build_export, warm_up_worker
+from utils.metrics import RENDER_SECONDS, EXPORT_JOBS
+
+logger = logging.getLogger(__name__)
+
+EXPORT_WORKERS = int(os.getenv("EXPORT_WORKERS", 1))
+EXPORT_DIR = os.getenv("EXPORT_DIR", tempfile.gettempdir())
+JOB_POLL_SECONDS = 2
+JOB_HEARTBEAT_SECONDS = 30
+JOB_STALE_AFTER = timedelta(seconds=int(os.getenv("EXPORT_JOB_STALE_SECONDS", 120)))
+JOB_MAX_ATTEMPTS = 3
+MAINTENANCE_INTERVAL_SECONDS = 60
+
+# kind -> (file name, caption, message when there is nothing to export)
+DELIVERY = {
+    "pdf": ("receipt_{user_id}.pdf", "🧾 Here is your expense receipt.", "⚠️ You have no expenses to generate a receipt."),
+    "excel": ("expenses_report.xlsx", "📊 Here is your Excel report. You can open this in Google Sheets or Excel.", "⚠️ No data found."),
+}
+EXTENSIONS = {"pdf": ".pdf", "excel": ".xlsx"}
+
+_pool = None
+_wake = asyncio.Event()
+
+
+def notify_workers():
+    """Called after enqueueing so an idle worker starts right away."""
+    _wake.set()
+
+
+def _get_pool():
+    global _pool
+    if _pool is None:
+        # spawn: children must not inherit the parent's open database connections
+        _pool = ProcessPoolExecutor(
+            max_workers=EXPORT_WORKERS, mp_context=multiprocessing.get_context("spawn"),
+            initializer=warm_up_worker
+        )
+    return _pool
+
+
+async def _keep_alive(job_id):
+    while True:
+        await asyncio.sleep(JOB_HEARTBEAT_SECONDS)
+        with suppress(Exception):
+            await heartbeat(job_id)
+
+
+async def _run_job(bot, job):
+    params = json.loads(job.params)
+    path = os.path.join(EXPORT_DIR, f"export_job_{job.id}{EXTENSIONS[job.kind]}")
+    file_name, caption, empty_text = DELIVERY[job.kind]
+    keep_alive = asyncio.create_task(_keep_alive(job.id))
+    try:
+        loop = asyncio.get_running_loop()
+        with RENDER_SECONDS.labels(job.kind).time():
+            count = await loop.run_in_executor(_get_pool(), build_export, job.kind, path, job.user_id, params)
+
+        if count:
+            document = FSInputFile(path, filename=file_name.format(user_id=job.user_id))
+            await bot.send_document(job.chat_id, document, caption=caption)
+        else:
+            await bot.send_message(job.chat_id, empty_text)
+        await finish_job(job.id, "done")
+        EXPORT_JOBS.labels(job.kind, "done").inc()
+    except Exception as e:
+        logger.exception("Export job %s failed (attempt %s)", job.id, job.attempts)
+        if job.attempts < JOB_MAX_ATTEMPTS:
+            await finish_job(job.id, "pending", repr(e)) # retried by the next free worker
+            EXPORT_JOBS.labels(job.kind, "retried").inc()
+        else:
+            await finish_job(job.id, "failed", repr(e))
+            EXPORT_JOBS.labels(job.kind, "failed").inc()
+            with suppress(Exception):
+                await bot.send_message(job.chat_id, "❌ Sorry, your export could not be generated. Please try again later.")
+    finally:
+        keep_alive.cancel()
+        with suppress(FileNotFoundError):
+            os.remove(path)
+
+
+async def process_next_job(bot):
+    """Runs one pending job to completion. Returns False if the queue is empty."""
+    job = await claim_next_job()
+    if job is None:
+        return False
+    await _run_job(bot, job)
+    return True
+
+
+async def _worker(bot):
+    while True:
+        try:
+            if await process_next_job(bot):
+                continue
+        except Exception:
+            logger.exception("Export worker error")
+        _wake.clear()
+        with suppress(asyncio.TimeoutError):
+            await asyncio.wait_for(_wake.wait(), JOB_POLL_SECONDS)
+
+
+async def _maintenance():
+    while True:
+        try:
+            requeued = await requeue_stale_jobs(JOB_STALE_AFTER, JOB_MAX_ATTEMPTS)
+            if requeued:
+                logger.info("Requeued %d interrupted export job(s)", requeued)
+                notify_workers()
+            await delete_finished_jobs()
+        except Exception:
+            logger.exception("Export job maintenance failed")
+        await asyncio.sleep(MAINTENANCE_INTERVAL_SECONDS)
+
+
+def start_export_workers(bot):
+    """Starts the worker and maintenance coroutines; returns their tasks."""
+    return [asyncio.create_task(_maintenance())] + [
+        asyncio.create_task(_worker(bot)) for _ in range(EXPORT_WORKERS)
+    ]
+
+
+def shutdown_export_pool():
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(cancel_futures=True)
+        _pool = None
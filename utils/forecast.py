@@ -0,0 +1,137 @@
+"""
+Vectorized spending analytics behind "🔮 Forecast".
+
+`analyze` turns the (day, category, total) buckets of the last 12 months
+(data/analytics.py) into a day x category matrix and derives with NumPy:
+- 7 and 30 day rolling averages of the daily spending, over complete days (not today);
+- weekday seasonality: each weekday's average day relative to the overall average,
+  pulled towards 1.0 so that one big Saturday does not make every Saturday expensive;
+- the month-end projection: spent so far plus, for every remaining day, the 30 day
+  average scaled by that day's weekday factor; None before MIN_PROJECTION_DAYS
+  complete days, a first expense today says nothing about the rest of the month;
+- per-category trends: least-squares slope of the monthly totals of complete months;
+- anomalies: recent days on which a category cost more than ANOMALY_Z standard
+  deviations above that category's usual spending day.
+
+NumPy is imported on first use, like the other heavy libraries.
+"""
+import calendar
+from datetime import datetime
+from typing import NamedTuple
+from data.analytics import analytics_window
+
+WEEKDAYS = ("Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun")
+ANOMALY_Z = 3.0
+ANOMALY_MIN_DAYS = 5 # spending days a category needs before it can be flagged
+ANOMALY_LOOKBACK_DAYS = 30
+MIN_PROJECTION_DAYS = 7
+MIN_SEASONALITY_DAYS = 28 # four of each weekday
+SEASONALITY_PRIOR_DAYS = 7 # average days mixed into each weekday's factor
+MIN_TREND_MONTHS = 3
+MIN_TREND_SLOPE = 1.0 # $/month; flatter trends are not worth mentioning
+
+
+class ForecastAnalysis(NamedTuple):
+    spent_this_month: float
+    month_by_category: list # [(category, total)] for this month, biggest first
+    avg_7d: float
+    avg_30d: float
+    weekday_factors: tuple # Monday first, 1.0 = an average day
+    projected_month: float # variable spending expected by the end of the month, None without enough history
+    trends: list # [(category, slope per month, mean per month)], steepest first
+    anomalies: list # [(date, category, amount, usual amount)], most unusual first
+
+
+def _weekday(days):
+    # 1970-01-01, day 0 of datetime64[D], was a Thursday
+    return (days.astype("int64") + 3) % 7
+
+
+def analyze(rows, now=None):
+    """`rows`: (day 'YYYY-MM-DD', category, total). Returns a ForecastAnalysis or None without data."""
+    if not rows:
+        return None
+    import numpy as np
+
+    now = now or datetime.utcnow()
+    first_day, end = analytics_window(now)
+    start = np.datetime64(first_day.date(), "D")
+    n_days = (end - first_day).days
+
+    days, categories, totals = zip(*rows)
+    day_index = (np.array(days, dtype="datetime64[D]") - start).astype(int)
+    names, category_index = np.unique(np.array(categories, dtype=str), return_inverse=True)
+    matrix = np.zeros((n_days, len(names)))
+    np.add.at(matrix, (day_index, category_index), np.array(totals, dtype=float))
+
+    dates = start + np.arange(n_days)
+    months = dates.astype("datetime64[M]")
+    month_index = (months - months[0]).astype(int)
+    monthly = np.zeros((month_index[-1] + 1, len(names)))
+    np.add.at(monthly, month_index, matrix)
+
+    # Daily figures only from the user's first expense on; today is still running
+    first_active = int(day_index.min())
+    daily = matrix[first_active:].sum(axis=1)
+    complete = daily[:-1]
+    weekdays = _weekday(dates[first_active:])
+
+    def rolling_mean(values, window):
+        window = min(window, len(values))
+        if not window:
+            return 0.0
+        return float(np.convolve(values, np.ones(window) / window, "valid")[-1])
+
+    avg_7d = rolling_mean(complete, 7)
+    avg_30d = rolling_mean(complete, 30)
+
+    factors = np.ones(7)
+    if len(complete) >= MIN_SEASONALITY_DAYS and complete.mean() > 0:
+        counts = np.bincount(weekdays[:len(complete)], minlength=7)
+        sums = np.bincount(weekdays[:len(complete)], weights=complete, minlength=7)
+        average = complete.mean()
+        factors = (sums + SEASONALITY_PRIOR_DAYS * average) / ((counts + SEASONALITY_PRIOR_DAYS) * average)
+
+    this_month = monthly[-1]
+    projected = None
+    if len(complete) >= MIN_PROJECTION_DAYS:
+        _, days_in_month = calendar.monthrange(now.year, now.month)
+        remaining = np.datetime64(now.date(), "D") + np.arange(1, days_in_month - now.day + 1)
+        projected = float(this_month.sum() + avg_30d * factors[_weekday(remaining)].sum())
+
+    trends = []
+    # Complete months only; the month of the first expense counts if it started on the 1st
+    first_month = month_index[first_active] + (1 if dates[first_active] != months[first_active] else 0)
+    history = monthly[first_month:-1]
+    if len(history) >= MIN_TREND_MONTHS:
+        slopes = np.polyfit(np.arange(len(history)), history, 1)[0]
+        means = history.mean(axis=0)
+        for i in np.argsort(-np.abs(slopes)):
+            if abs(slopes[i]) >= MIN_TREND_SLOPE:
+                trends.append((str(names[i]), float(slopes[i]), float(means[i])))
+
+    # Mean and spread of each category over the days it was spent on
+    spent = matrix[first_active:] > 0
+    spend_days = spent.sum(axis=0)
+    mean = matrix[first_active:].sum(axis=0) / np.maximum(spend_days, 1)
+    std = np.sqrt((((matrix[first_active:] - mean) ** 2) * spent).sum(axis=0) / np.maximum(spend_days, 1))
+    recent = matrix[-ANOMALY_LOOKBACK_DAYS:]
+    z = (recent - mean) / np.where(std > 0, std, np.inf)
+    flagged = (z > ANOMALY_Z) & (recent > 0) & (spend_days >= ANOMALY_MIN_DAYS)
+    anomalies = []
+    for row, col in zip(*np.nonzero(flagged)):
+        day = dates[-len(recent) + row].astype(datetime)
+        anomalies.append((z[row, col], day, str(names[col]), float(recent[row, col]), float(mean[col])))
+    anomalies = [a[1:] for a in sorted(anomalies, key=lambda a: -a[0])]
+
+    order = np.argsort(-this_month)
+    return ForecastAnalysis(
+        spent_this_month=float(this_month.sum()),
+        month_by_category=[(str(names[i]), float(this_month[i])) for i in order if this_month[i] > 0],
+        avg_7d=avg_7d,
+        avg_30d=avg_30d,
+        weekday_factors=tuple(float(f) for f in factors),
+        projected_month=projected,
+        trends=trends,
+        anomalies=anomalies,
+    )
@@ -25,21 +25,45 @@ def get_category_keyboard():
     keyboard.append([KeyboardButton(text="✏️ Custom")])
     return ReplyKeyboardMarkup(keyboard=keyboard, resize_keyboard=True)
 
-def get_delete_keyboard(expenses):
+def get_delete_keyboard(expenses, selected=(), has_older=False, has_newer=False):
     builder = InlineKeyboardBuilder()
     for expense in expenses:
-        button_text = f"{expense.category} - ${expense.amount}"
-        builder.button(text=button_text, callback_data=f"del_{expense.id}")
-    builder.button(text="❌ Cancel", callback_data="del_cancel")
-    builder.adjust(1)
+        mark = "☑️" if expense.id in selected else "⬜"
+        button_text = f"{mark} {expense.timestamp:%m-%d} {expense.category} - ${expense.amount:.2f}"
+        builder.row(InlineKeyboardButton(text=button_text, callback_data=f"del_t_{expense.id}"))
+
+    navigation = []
+    if has_older:
+        navigation.append(InlineKeyboardButton(text="◀ Older", callback_data="del_older"))
+    if has_newer:
+        navigation.append(InlineKeyboardButton(text="Newer ▶", callback_data="del_newer"))
+    if navigation:
+        builder.row(*navigation)
+
+    builder.row(
+        InlineKeyboardButton(text=f"🗑 Delete selected ({len(selected)})", callback_data="del_confirm"),
+        InlineKeyboardButton(text="❌ Cancel", callback_data="del_cancel")
+    )
     return builder.as_markup()
 
+def get_history_keyboard(older_data=None, newer_data=None):
+    buttons = []
+    if older_data:
+        buttons.append(InlineKeyboardButton(text="◀ Older", callback_data=older_data))
+    if newer_data:
+        buttons.append(InlineKeyboardButton(text="Newer ▶", callback_data=newer_data))
+    return InlineKeyboardMarkup(inline_keyboard=[buttons]) if buttons else None
+
 def get_export_keyboard():
     return InlineKeyboardMarkup(
         inline_keyboard=[
             [
                 InlineKeyboardButton(text="📄 PDF Receipt", callback_data="download_pdf"),
                 InlineKeyboardButton(text="📊 Excel Report", callback_data="download_excel")
+            ],
+            [
+                InlineKeyboardButton(text="📄 PDF This Month", callback_data="download_pdf_current"),
+                InlineKeyboardButton(text="📄 PDF Last Month", callback_data="download_pdf_previous")
             ]
         ]
     )
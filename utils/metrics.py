@@ -0,0 +1,199 @@
+"""
+Prometheus metrics, served on /metrics by the health server in bot.py.
+
+- Updates: count and latency per router/handler, recorded by `UpdateMetricsMiddleware`
+  (outer, on dp.update) with `HandlerLabelMiddleware` (inner, on every event type)
+  telling it which handler ran.
+- Database: query latency per statement type, via engine cursor events.
+- Rendering: chart / PDF / Excel render times (`RENDER_SECONDS`), export job outcomes,
+  CSV import rows, budget alerts sent.
+- Bot API: call latency and errors per method, via a bot session middleware. Methods
+  a handler returns (`return message.answer(...)`) are executed by aiogram after the
+  update: in polling through the session (so they are timed, and their errors counted
+  and only logged), in webhook mode as the webhook response, which no Bot API metric
+  sees. `UpdateMetricsMiddleware` counts them all in `bot_api_returned_methods_total`.
+- Event loop lag, sampled in the background; also shown by the health check.
+- Cache hit/miss counters of the user profile and chart caches.
+"""
+import time
+import asyncio
+from aiogram import BaseMiddleware
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware
+from aiogram.dispatcher.event.bases import UNHANDLED
+from aiogram.methods import TelegramMethod
+from prometheus_client import Counter, Gauge, Histogram, REGISTRY, generate_latest, CONTENT_TYPE_LATEST
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+from sqlalchemy import event
+from data.user_cache import cache_stats as user_cache_stats
+from utils.chart_cache import cache_stats as chart_cache_stats
+
+UPDATES = Counter(
+    "bot_updates_total", "Processed updates", ["router", "handler", "status"]
+)
+UPDATE_SECONDS = Histogram(
+    "bot_update_seconds", "Time to process an update, filters and middlewares included", ["router", "handler"]
+)
+DB_QUERY_SECONDS = Histogram(
+    "bot_db_query_seconds", "Database statement execution time", ["operation"],
+    buckets=(.001, .0025, .005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5)
+)
+RENDER_SECONDS = Histogram(
+    "bot_render_seconds", "Chart / PDF / Excel render time", ["kind"],
+    buckets=(.05, .1, .25, .5, 1, 2.5, 5, 10, 30, 60, 120)
+)
+THROTTLED = Counter(
+    "bot_throttled_total", "Heavy requests not started: coalesced, per-user limit or busy", ["operation", "reason"]
+)
+EXPORT_JOBS = Counter(
+    "bot_export_jobs_total", "Finished export jobs", ["kind", "status"]
+)
+IMPORT_ROWS = Counter(
+    "bot_import_rows_total", "CSV rows processed by /import", ["result"]
+)
+BUDGET_ALERTS = Counter(
+    "bot_budget_alerts_total", "Budget threshold alerts sent", ["threshold"]
+)
+BOT_API_SECONDS = Histogram(
+    "bot_api_request_seconds",
+    "Telegram Bot API call latency (without methods returned as webhook responses)", ["method"]
+)
+BOT_API_ERRORS = Counter(
+    "bot_api_errors_total", "Failed Telegram Bot API calls", ["method", "error"]
+)
+BOT_API_RETURNED = Counter(
+    "bot_api_returned_methods_total",
+    "Bot API methods returned by handlers and executed by aiogram (in webhook mode as the response)",
+    ["method"]
+)
+EVENT_LOOP_LAG = Gauge(
+    "bot_event_loop_lag_seconds", "Latest measured event loop lag"
+)
+EVENT_LOOP_LAG_SAMPLES = Histogram(
+    "bot_event_loop_lag_sample_seconds", "Event loop lag samples",
+    buckets=(.001, .005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5)
+)
+
+EVENT_LOOP_LAG_INTERVAL = 0.5
+
+last_event_loop_lag = 0.0
+
+
+def _handler_labels(handler):
+    # Each handlers/ module has exactly one router, so its module name identifies the router
+    callback = handler.callback
+    return callback.__module__.rsplit(".", 1)[-1], callback.__name__
+
+
+class UpdateMetricsMiddleware(BaseMiddleware):
+    """Outer middleware on dp.update: times every update and counts it by handler and outcome."""
+
+    async def __call__(self, handler, event, data):
+        labels = {"router": "none", "handler": "unhandled"}
+        data["metrics_labels"] = labels # filled in by HandlerLabelMiddleware
+        started = time.perf_counter()
+        status = "ok"
+        try:
+            result = await handler(event, data)
+            if result is UNHANDLED:
+                status = "unhandled"
+            elif isinstance(result, TelegramMethod):
+                BOT_API_RETURNED.labels(type(result).__name__).inc()
+            return result
+        except Exception:
+            status = "error"
+            raise
+        finally:
+            UPDATE_SECONDS.labels(labels["router"], labels["handler"]).observe(time.perf_counter() - started)
+            UPDATES.labels(labels["router"], labels["handler"], status).inc()
+
+
+class HandlerLabelMiddleware(BaseMiddleware):
+    """Inner middleware: runs once the handler is resolved and records which one it is."""
+
+    async def __call__(self, handler, event, data):
+        labels = data.get("metrics_labels")
+        if labels is not None and "handler" in data:
+            labels["router"], labels["handler"] = _handler_labels(data["handler"])
+        return await handler(event, data)
+
+
+class BotApiMetricsMiddleware(BaseRequestMiddleware):
+    """Session middleware: latency and errors of every Bot API call."""
+
+    async def __call__(self, make_request, bot, method):
+        name = type(method).__name__
+        started = time.perf_counter()
+        try:
+            return await make_request(bot, method)
+        except Exception as e:
+            BOT_API_ERRORS.labels(name, type(e).__name__).inc()
+            raise
+        finally:
+            BOT_API_SECONDS.labels(name).observe(time.perf_counter() - started)
+
+
+def setup_dispatcher_metrics(dp):
+    dp.update.outer_middleware(UpdateMetricsMiddleware())
+    label_middleware = HandlerLabelMiddleware()
+    for name, observer in dp.observers.items():
+        if name not in ("update", "error"):
+            # Inner middlewares of the dispatcher also wrap the handlers of every included router
+            observer.middleware(label_middleware)
+
+
+def setup_bot_metrics(bot):
+    bot.session.middleware(BotApiMetricsMiddleware())
+
+
+def instrument_engine(engine):
+    sync_engine = engine.sync_engine
+
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        started = conn.info["query_started"].pop()
+        operation = statement.lstrip().split(None, 1)[0].upper() if statement.strip() else "OTHER"
+        DB_QUERY_SECONDS.labels(operation).observe(time.perf_counter() - started)
+
+    @event.listens_for(sync_engine, "handle_error")
+    def _handle_error(context):
+        if context.connection is not None and context.connection.info.get("query_started"):
+            context.connection.info["query_started"].pop()
+
+
+async def monitor_event_loop_lag(interval=EVENT_LOOP_LAG_INTERVAL):
+    """Sleeps `interval` in a loop; anything beyond that is time the loop was blocked."""
+    global last_event_loop_lag
+    loop = asyncio.get_running_loop()
+    while True:
+        started = loop.time()
+        await asyncio.sleep(interval)
+        lag = max(0.0, loop.time() - started - interval)
+        last_event_loop_lag = lag
+        EVENT_LOOP_LAG.set(lag)
+        EVENT_LOOP_LAG_SAMPLES.observe(lag)
+
+
+class _CacheCollector:
+    """Exposes the hit/miss/size counters the caches keep themselves."""
+
+    def collect(self):
+        for name, stats in (("user_profile", user_cache_stats()), ("chart", chart_cache_stats())):
+            hits = CounterMetricFamily(f"bot_{name}_cache_hits", f"{name} cache hits")
+            hits.add_metric([], stats["hits"])
+            misses = CounterMetricFamily(f"bot_{name}_cache_misses", f"{name} cache misses")
+            misses.add_metric([], stats["misses"])
+            size = GaugeMetricFamily(f"bot_{name}_cache_size", f"{name} cache entries")
+            size.add_metric([], stats["size"])
+            yield from (hits, misses, size)
+
+
+REGISTRY.register(_CacheCollector())
+
+
+def render_latest():
+    """Returns (body, content type) for the /metrics response."""
+    return generate_latest(REGISTRY), CONTENT_TYPE_LATEST
@@ -1,105 +1,175 @@
-import io
-from reportlab.pdfgen import canvas
-from reportlab.lib.units import mm
 from datetime import datetime
 
-def generate_receipt_pdf(user_name, expenses):
+mm = 72 / 25.4 # points per millimetre, same as reportlab.lib.units.mm
+
+PAGE_WIDTH = 80 * mm
+PAGE_HEIGHT = 297 * mm # thermal roll cut into A4-length pages
+LEFT = 5 * mm
+RIGHT = 75 * mm
+ROW_HEIGHT = 5 * mm
+PAGE_FOOTER_SPACE = 25 * mm # reserved at the bottom of every page for the subtotal
+FINAL_BLOCK_SPACE = 65 * mm # totals + "thank you" footer on the last page
+
+
+def generate_receipt_pdf(user_name, expenses, output, start_date=None, end_date=None, archived=()):
     """
-    Generates a PDF receipt looking like a thermal printout.
-    Returns a BytesIO object containing the PDF data.
+    Generates a PDF receipt looking like a thermal printout, split over fixed-size
+    pages with a subtotal and running total at the bottom of each page.
+
+    `expenses` is any iterable of (timestamp, category, description, amount, id) rows;
+    it is consumed once, so rows can be streamed. `output` is a file path or binary
+    file object. `start_date`/`end_date` only label the period in the header, the
+    caller filters the rows. `archived` holds (year_month, category, total, count)
+    summaries of archived months, drawn as one line each after the rows.
+    Returns the number of expenses drawn.
     """
+    # ReportLab is imported on first use to keep bot startup light
+    from reportlab.pdfgen import canvas
+
+    c = canvas.Canvas(output, pagesize=(PAGE_WIDTH, PAGE_HEIGHT), pageCompression=1)
 
-    width = 80 * mm
-    height = (150 + (len(expenses) * 10)) * mm 
-    
-    buffer = io.BytesIO()
-    c = canvas.Canvas(buffer, pagesize=(width, height))
-    
     def draw_centered(text, y, font_size=10, font="Courier-Bold"):
         c.setFont(font, font_size)
         text_width = c.stringWidth(text, font, font_size)
-        c.drawString((width - text_width) / 2, y, text)
+        c.drawString((PAGE_WIDTH - text_width) / 2, y, text)
 
     def draw_line(y):
         c.setDash(3, 3) # 3 points on, 3 off
-        c.line(5 * mm, y, 75 * mm, y)
+        c.line(LEFT, y, RIGHT, y)
         c.setDash([]) # Reset to solid
 
-    
-    y = height - 15 * mm # Start from top
-    
-    # Header
-    draw_centered("BUDGET TRACKER BOT", y, 12)
-    y -= 5 * mm
-    draw_centered(f"User: {user_name}", y, 8, "Courier")
-    y -= 5 * mm
-    draw_centered(datetime.now().strftime("%Y-%m-%d %H:%M"), y, 8, "Courier")
-    
-    y -= 8 * mm
-    draw_centered("********************************", y, 8, "Courier")
-    y -= 5 * mm
-    draw_centered("CASH RECEIPT", y, 14, "Courier-Bold")
-    y -= 5 * mm
-    draw_centered("********************************", y, 8, "Courier")
-    
-    y -= 10 * mm
-    
-    # Table Headers
-    c.setFont("Courier-Bold", 9)
-    c.drawString(5 * mm, y, "Description")
-    c.drawRightString(75 * mm, y, "Price")
-    
-    y -= 3 * mm
-    draw_line(y)
-    y -= 5 * mm
-    
-    # Expenses Loop
+    def draw_table_header(y):
+        c.setFont("Courier-Bold", 9)
+        c.drawString(LEFT, y, "Date  Description")
+        c.drawRightString(RIGHT, y, "Price")
+        y -= 3 * mm
+        draw_line(y)
+        c.setFont("Courier", 9)
+        return y - 5 * mm
+
+    def draw_first_header():
+        y = PAGE_HEIGHT - 15 * mm
+        draw_centered("BUDGET TRACKER BOT", y, 12)
+        y -= 5 * mm
+        draw_centered(f"User: {user_name}", y, 8, "Courier")
+        y -= 5 * mm
+        draw_centered(datetime.now().strftime("%Y-%m-%d %H:%M"), y, 8, "Courier")
+        y -= 5 * mm
+        draw_centered(period_label, y, 8, "Courier")
+
+        y -= 8 * mm
+        draw_centered("********************************", y, 8, "Courier")
+        y -= 5 * mm
+        draw_centered("CASH RECEIPT", y, 14, "Courier-Bold")
+        y -= 5 * mm
+        draw_centered("********************************", y, 8, "Courier")
+        return draw_table_header(y - 10 * mm)
+
+    def draw_continued_header(page_no, brought_forward):
+        y = PAGE_HEIGHT - 15 * mm
+        draw_centered("BUDGET TRACKER BOT", y, 10)
+        y -= 5 * mm
+        draw_centered(f"Page {page_no} (continued)", y, 8, "Courier")
+        y -= 6 * mm
+        c.setFont("Courier", 8)
+        c.drawString(LEFT, y, "Brought forward")
+        c.drawRightString(RIGHT, y, f"{brought_forward:.2f}")
+        return draw_table_header(y - 6 * mm)
+
+    def draw_page_footer(y, page_no, page_subtotal, running_total):
+        y -= 2 * mm
+        draw_line(y)
+        y -= 5 * mm
+        c.setFont("Courier", 8)
+        c.drawString(LEFT, y, "Page subtotal")
+        c.drawRightString(RIGHT, y, f"{page_subtotal:.2f}")
+        y -= 4 * mm
+        c.drawString(LEFT, y, "Carried forward")
+        c.drawRightString(RIGHT, y, f"{running_total:.2f}")
+        draw_centered(f"- {page_no} -", 8 * mm, 8, "Courier")
+
+    if start_date or end_date:
+        period_label = (
+            f"Period: {start_date.strftime('%Y-%m-%d') if start_date else '...'}"
+            f" - {end_date.strftime('%Y-%m-%d') if end_date else '...'}"
+        )
+    else:
+        period_label = "Period: All time"
+
+    page_no = 1
+    y = draw_first_header()
     total = 0.0
-    c.setFont("Courier", 9)
-    
-    for exp in expenses:
-        # Truncate category if too long
-        cat_name = (exp.category[:15] + '..') if len(exp.category) > 15 else exp.category
-        price_str = f"{exp.amount:.2f}"
-        
-        c.drawString(5 * mm, y, cat_name)
-        c.drawRightString(75 * mm, y, price_str)
-        
-        total += exp.amount
-        y -= 5 * mm # Move down for next item
+    page_subtotal = 0.0
+    count = 0
+
+    def receipt_lines():
+        # (label, amount, number of expenses) per printed line
+        for timestamp, category, _description, amount, _id in expenses:
+            # Truncate category if too long
+            cat_name = (category[:15] + '..') if len(category) > 15 else category
+            yield f"{timestamp.strftime('%m-%d')} {cat_name}", amount, 1
+        for month, category, amount, n in archived:
+            cat_name = (category[:9] + '..') if len(category) > 9 else category
+            yield f"{month} {cat_name} x{n}", amount, n
+
+    for label, amount, n in receipt_lines():
+        if y < PAGE_FOOTER_SPACE:
+            draw_page_footer(y, page_no, page_subtotal, total)
+            c.showPage()
+            page_no += 1
+            page_subtotal = 0.0
+            y = draw_continued_header(page_no, total)
+
+        c.drawString(LEFT, y, label)
+        c.drawRightString(RIGHT, y, f"{amount:.2f}")
+
+        total += amount
+        page_subtotal += amount
+        count += n
+        y -= ROW_HEIGHT # Move down for next item
+
+    if y < FINAL_BLOCK_SPACE:
+        # Not enough room left for the totals block
+        draw_page_footer(y, page_no, page_subtotal, total)
+        c.showPage()
+        page_no += 1
+        y = draw_continued_header(page_no, total)
 
     y -= 2 * mm
     draw_line(y)
     y -= 6 * mm
-    
+
     # Total
     c.setFont("Courier-Bold", 14)
-    c.drawString(5 * mm, y, "Total")
-    c.drawRightString(75 * mm, y, f"${total:.2f}")
-    
+    c.drawString(LEFT, y, "Total")
+    c.drawRightString(RIGHT, y, f"${total:.2f}")
+
     y -= 10 * mm
-    
+
     # Footer Info
     c.setFont("Courier", 8)
-    c.drawString(5 * mm, y, "Cash")
-    c.drawRightString(75 * mm, y, f"{total:.2f}")
+    c.drawString(LEFT, y, f"Items: {count}")
+    c.drawRightString(RIGHT, y, f"Pages: {page_no}")
     y -= 4 * mm
-    c.drawString(5 * mm, y, "Change")
-    c.drawRightString(75 * mm, y, "0.00")
-    
+    c.drawString(LEFT, y, "Cash")
+    c.drawRightString(RIGHT, y, f"{total:.2f}")
+    y -= 4 * mm
+    c.drawString(LEFT, y, "Change")
+    c.drawRightString(RIGHT, y, "0.00")
+
     y -= 8 * mm
     draw_centered("********************************", y, 8, "Courier")
     y -= 5 * mm
     draw_centered("THANK YOU!", y, 10, "Courier-Bold")
-    
+
     y -= 8 * mm
     draw_line(y)
     y -= 5 * mm
 
-    c.drawString(5 * mm, y, "By : Tekleeyesus Munye")
+    c.setFont("Courier", 8)
+    c.drawString(LEFT, y, "By : Tekleeyesus Munye")
     y -= 4 * mm
-    c.drawString(5 * mm, y, "Email: tekleeyesus21@gmail.com")
+    c.drawString(LEFT, y, "Email: tekleeyesus21@gmail.com")
 
     c.save()
-    buffer.seek(0)
-    return buffer
\ No newline at end of file
+    return count
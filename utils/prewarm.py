@@ -0,0 +1,38 @@
+"""
+Background import of the heavy libraries that handlers load on first use.
+
+pandas (CSV import) and NumPy (Forecast) are imported lazily so the bot starts
+fast and small. With PREWARM_IMPORTS=1 they are imported in a worker thread shortly
+after the bot starts serving, so the first import or forecast does not pay for them either. (ReportLab and openpyxl
+are only used by the export worker processes, which load them at start.)
+"""
+import os
+import time
+import asyncio
+import logging
+import importlib
+
+logger = logging.getLogger(__name__)
+
+PREWARM_IMPORTS = os.getenv("PREWARM_IMPORTS", "0") == "1"
+PREWARM_DELAY_SECONDS = float(os.getenv("PREWARM_DELAY_SECONDS", 5))
+
+HEAVY_MODULES = ("numpy", "pandas")
+
+
+def _import(name):
+    started = time.perf_counter()
+    importlib.import_module(name)
+    return time.perf_counter() - started
+
+
+async def prewarm_imports(modules=HEAVY_MODULES, delay=PREWARM_DELAY_SECONDS):
+    # Give polling/webhook setup a head start before competing for the CPU
+    await asyncio.sleep(delay)
+    for name in modules:
+        try:
+            seconds = await asyncio.to_thread(_import, name)
+        except ImportError:
+            logger.warning("Prewarm: %s is not installed", name)
+            continue
+        logger.info("Prewarm: imported %s in %.2fs", name, seconds)
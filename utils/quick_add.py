@@ -0,0 +1,80 @@
+"""
+Parser for quick-add messages: one or many "15 Food" / "Taxi 20" lines.
+
+Understands currency symbols and codes ("$15", "15 usd", "€ 3,50"), thousands
+separators ("1,234.50", "1'200") and a separator between amount and category
+("Food - 12", "12: Taxi"). Several entries can share a line when separated by ";".
+Negative amounts ("Food -5", "Refund -20") are rejected, not saved as expenses.
+A category that starts or ends with a bare number ("Rent 1 200") is ambiguous and
+rejected rather than guessed.
+"""
+import re
+
+MAX_AMOUNT = 1_000_000_000
+MAX_CATEGORY_LENGTH = 64
+
+_CURRENCY = r"(?:[$€£¥₹₽₺₩]|(?:usd|eur|gbp|etb|birr)\b)"
+# "1,234.50" / "1'234" (thousands) or "1234.5" / "12,50" (decimal comma)
+_NUMBER = r"(?P<number>\d{1,3}(?:[,'\u00a0\u202f]\d{3})+(?:\.\d{1,2})?|\d+(?:[.,]\d{1,2})?)"
+_MONEY = rf"(?:{_CURRENCY}\s*)?{_NUMBER}(?:\s*{_CURRENCY})?"
+# A dash only with spaces around it: "Food -5" is a negative amount, not "Food" and 5
+_SEPARATOR = r"(?:\s+[-–—]\s+|\s*[:=,]\s*|\s+)"
+
+AMOUNT_FIRST = re.compile(rf"^{_MONEY}{_SEPARATOR}(?P<category>.+?)$", re.IGNORECASE)
+CATEGORY_FIRST = re.compile(rf"^(?P<category>.+?){_SEPARATOR}{_MONEY}$", re.IGNORECASE)
+AMOUNT_ONLY = re.compile(rf"^(?P<sign>-)?\s*{_MONEY}$", re.IGNORECASE)
+ENTRY_SPLIT = re.compile(r"[\n;]+")
+HAS_LETTER = re.compile(r"[^\W\d_]")
+BARE_NUMBER_EDGE = re.compile(r"^\d[\d.,'\u00a0\u202f]*(?:\s|$)|\s\d[\d.,'\u00a0\u202f]*$")
+DECIMAL_COMMA = re.compile(r"\d+,\d{1,2}")
+THOUSANDS_SEPARATOR = re.compile(r"[,'\u00a0\u202f]")
+
+
+def parse_number(number):
+    if DECIMAL_COMMA.fullmatch(number):
+        return float(number.replace(",", "."))
+    return float(THOUSANDS_SEPARATOR.sub("", number))
+
+
+def parse_amount(text):
+    """"$1,234.50" / "€ 9,99" / "-12" -> float, or None if the text is not exactly one amount."""
+    match = AMOUNT_ONLY.match(text.strip())
+    if not match:
+        return None
+    amount = parse_number(match.group("number"))
+    return -amount if match.group("sign") else amount
+
+
+def parse_entry(entry):
+    """"15 Food" / "Taxi - $20" -> (amount, "Category"), or None if it is not an expense."""
+    entry = entry.strip()
+    match = AMOUNT_FIRST.match(entry) or CATEGORY_FIRST.match(entry)
+    if not match:
+        return None
+
+    amount = parse_number(match.group("number"))
+    category = match.group("category").strip(" -:=,–—")
+    if not 0 < amount < MAX_AMOUNT or not HAS_LETTER.search(category) or len(category) > MAX_CATEGORY_LENGTH:
+        return None
+    if BARE_NUMBER_EDGE.search(category):
+        # "Rent 1 200": 200 for "Rent 1" or 1200 for "Rent"? Let the user rewrite it
+        return None
+    # Capitalize category for consistency (e.g. "food" -> "Food")
+    return amount, category.title()
+
+
+def parse_entries(text):
+    """
+    Splits a message into entries and parses each one.
+    Returns (parsed [(amount, category), ...], rejected [entry text, ...]).
+    """
+    parsed, rejected = [], []
+    for entry in ENTRY_SPLIT.split(text):
+        if not entry.strip():
+            continue
+        result = parse_entry(entry)
+        if result:
+            parsed.append(result)
+        else:
+            rejected.append(entry.strip())
+    return parsed, rejected
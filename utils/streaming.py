@@ -0,0 +1,54 @@
+"""
+Feeds rows streamed from the database (async) into blocking writers running
+in a worker thread (openpyxl, ReportLab), with a bounded queue in between so
+only a few batches are ever held in memory.
+"""
+import queue
+import asyncio
+
+_DONE = object()
+_ABORT = object()
+POLL_SECONDS = 0.01
+
+
+async def _put(q, item, worker):
+    # Non-blocking put so the event loop never waits on a full queue
+    while True:
+        try:
+            q.put_nowait(item)
+            return True
+        except queue.Full:
+            if worker.done():
+                return False
+            await asyncio.sleep(POLL_SECONDS)
+
+
+async def stream_to_thread(batches, consume, max_pending=4):
+    """
+    Runs `consume(rows)` in a worker thread, where `rows` iterates over every
+    row of every batch yielded by the async iterator `batches`.
+    Returns whatever `consume` returns.
+    """
+    pending = queue.Queue(maxsize=max_pending)
+
+    def rows():
+        while True:
+            batch = pending.get()
+            if batch is _DONE:
+                return
+            if batch is _ABORT:
+                raise RuntimeError("row stream aborted")
+            yield from batch
+
+    worker = asyncio.ensure_future(asyncio.to_thread(consume, rows()))
+    try:
+        async for batch in batches:
+            if not await _put(pending, batch, worker):
+                break # consumer stopped early (it failed), its error is raised below
+        await _put(pending, _DONE, worker)
+    except BaseException:
+        await _put(pending, _ABORT, worker)
+        await asyncio.gather(worker, return_exceptions=True)
+        raise
+
+    return await worker
@@ -0,0 +1,113 @@
+"""
+Concurrency limits for heavy handlers (charts, CSV import).
+Exports have their own job queue (utils/export_worker.py).
+
+Handlers opt in with an aiogram flag naming their operation class:
+
+    @router.callback_query(F.data.startswith("stats_"), flags={"heavy": "stats"})
+
+`HeavyOperationMiddleware` then enforces, per update:
+- coalescing: the same request (same user, operation and button/text/file) while the
+  first one is still running gets a "still working" notice and waits for that job
+  instead of starting another one;
+- a per-user limit of heavy operations in flight (HEAVY_PER_USER_LIMIT);
+- a global semaphore per operation class (HEAVY_<CLASS>_CONCURRENCY), with at most
+  HEAVY_QUEUE_LIMIT updates waiting for it; beyond that the user is told to retry.
+"""
+import os
+import asyncio
+from collections import Counter
+from contextlib import suppress
+from aiogram import BaseMiddleware
+from aiogram.dispatcher.flags import get_flag
+from aiogram.types import CallbackQuery, Message
+from utils.metrics import THROTTLED
+
+HEAVY_CONCURRENCY = {
+    "stats": int(os.getenv("HEAVY_STATS_CONCURRENCY", 4)),
+    "import": int(os.getenv("HEAVY_IMPORT_CONCURRENCY", 1)),
+}
+HEAVY_PER_USER_LIMIT = int(os.getenv("HEAVY_PER_USER_LIMIT", 1))
+HEAVY_QUEUE_LIMIT = int(os.getenv("HEAVY_QUEUE_LIMIT", 20))
+
+STILL_WORKING = "⏳ Still working on your previous request…"
+BUSY = "🚦 The bot is busy right now, please try again in a moment."
+
+
+def request_key(event):
+    if isinstance(event, CallbackQuery):
+        return event.data
+    if isinstance(event, Message) and event.document:
+        return event.document.file_unique_id
+    return getattr(event, "text", None)
+
+
+async def notify(event, text):
+    if isinstance(event, CallbackQuery):
+        await event.answer(text) # also stops the button's loading spinner
+    elif isinstance(event, Message):
+        await event.answer(text)
+
+
+class HeavyOperationMiddleware(BaseMiddleware):
+    def __init__(self, concurrency=HEAVY_CONCURRENCY, per_user_limit=HEAVY_PER_USER_LIMIT,
+                 queue_limit=HEAVY_QUEUE_LIMIT):
+        self.semaphores = {name: asyncio.Semaphore(limit) for name, limit in concurrency.items()}
+        self.per_user_limit = per_user_limit
+        self.queue_limit = queue_limit
+        self._waiting = Counter()   # operation -> updates waiting for its semaphore
+        self._per_user = Counter()  # user_id -> heavy operations in flight
+        self._in_flight = {}        # (user_id, operation, request) -> future done when the job ends
+
+    async def __call__(self, handler, event, data):
+        operation = get_flag(data, "heavy")
+        user = data.get("event_from_user")
+        if not operation or user is None:
+            return await handler(event, data)
+
+        key = (user.id, operation, request_key(event))
+        running = self._in_flight.get(key)
+        if running is not None:
+            # Identical tap: join the job that is already running
+            THROTTLED.labels(operation, "coalesced").inc()
+            await notify(event, STILL_WORKING)
+            with suppress(Exception):
+                await asyncio.shield(running)
+            return None
+
+        if self._per_user[user.id] >= self.per_user_limit:
+            THROTTLED.labels(operation, "per_user").inc()
+            return await notify(event, STILL_WORKING)
+
+        semaphore = self.semaphores.setdefault(operation, asyncio.Semaphore(1))
+        if semaphore.locked() and self._waiting[operation] >= self.queue_limit:
+            THROTTLED.labels(operation, "busy").inc()
+            return await notify(event, BUSY)
+
+        done = asyncio.get_running_loop().create_future()
+        self._in_flight[key] = done
+        self._per_user[user.id] += 1
+        try:
+            self._waiting[operation] += 1
+            try:
+                await semaphore.acquire()
+            finally:
+                self._waiting[operation] -= 1
+            try:
+                return await handler(event, data)
+            finally:
+                semaphore.release()
+        finally:
+            del self._in_flight[key]
+            self._per_user[user.id] -= 1
+            if not self._per_user[user.id]:
+                del self._per_user[user.id]
+            done.set_result(None)
+
+
+def setup_throttling(dp):
+    middleware = HeavyOperationMiddleware()
+    # Inner middlewares: flags are only known once the handler has been resolved
+    dp.message.middleware(middleware)
+    dp.callback_query.middleware(middleware)
+    return middleware